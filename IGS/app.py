@@ -1,51 +1,132 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import os
 from pathlib import Path
-from IGS.generate_files import download_file_zip, estaciones_mas_cercanas
+from IGS.generate_files import FORMATO_DEFECTO, FORMATOS_SALIDA, download_file_zip, estaciones_mas_cercanas
 from IGS.components import mostrar_info_estacion_resumida
-from IGS.sumary_checker import descargar_summary, parsear_summary, verificar_disponibilidad_summary, obtener_formato_rinex
+from IGS.sumary_checker import cargar_summary, verificar_disponibilidad_summary, obtener_formato_rinex
+from IGS.availability import disponibilidad_rango
+from common.archive import NIVEL_COMPRESION_DEFECTO
+from common.rinex import resumen_qc
+from common.serving import mostrar_descarga
+from common.stations import registro_igs
+
+COLUMNAS_RESULTADOS = ['Station', 'Distance_km', 'Available', 'Mesagge']
+COLUMNAS_QC = ['Files', 'Epochs', 'Completeness_%', 'QC']
+# Muestreos ofrecidos sobre los datos de 1 s (divisores de los bloques de 15 min)
+INTERVALOS_S = [1, 5, 10, 15, 30, 60]
+ETIQUETAS_FORMATO = {
+    "rnx.zip": "RINEX in ZIP",
+    "crx.zip": "Hatanaka (.crx) in ZIP, no conversion",
+    "crx.gz.zip": "Original .crx.gz files from CDDIS in ZIP, no conversion",
+    "rnx.tar.xz": "RINEX in tar.xz",
+    "rnx.tar.zst": "RINEX in tar.zst",
+}
+
+def resumen_estacion(filas_qc, bloques_pedidos):
+    """Completitud de la estación sobre todos los bloques pedidos (los que no llegaron cuentan como 0 %)."""
+    estados = {fila["Status"] for fila in filas_qc} - {"OK"}
+    if len(filas_qc) < bloques_pedidos:
+        estados.add(f"MISSING {bloques_pedidos - len(filas_qc)}")
+    return {
+        "Files": len(filas_qc),
+        "Epochs": sum(fila["Epochs"] for fila in filas_qc),
+        "Completeness_%": round(sum(fila["Completeness_%"] for fila in filas_qc) / max(1, bloques_pedidos), 1),
+        "QC": ", ".join(sorted(estados)) or "OK",
+    }
 
 def main():
     st.header("**📥 File Download - International GNSS Service (IGS)**")
 
-    # --- Carga de datos inicial (usando caché para eficiencia) ---
-    @st.cache_data
-    def load_station_data(path):
-        try:
-            df = pd.read_csv(path, sep=",", header=0)
-            df.columns = df.columns.str.strip().str.lower()
-            df.rename(columns={"latitude": "latitud", "longitude": "longitud", "site name": "estacion"}, inplace=True)
-            return df
-        except FileNotFoundError:
-            return None
-        
-    df_stations = load_station_data("data/igs_stations.csv")
-
-    if df_stations is None:
+    # --- Carga de datos inicial (registro compartido entre sesiones) ---
+    try:
+        registro = registro_igs("data/igs_stations.csv")
+    except FileNotFoundError:
         st.error("File ‘data/igs_stations.csv’ was not found. The application cannot continue.")
         return
+    df_stations = registro.df
 
     # --- Inicializar Session State para guardar datos entre pasos ---
     if 'verification_results' not in st.session_state:
         st.session_state.verification_results = None
+    if 'availability_cube' not in st.session_state:
+        st.session_state.availability_cube = None
 
     # --- Paso 1: Entradas del Usuario ---
     st.subheader("**Define search parameters**")
+    modo = st.radio("Mode", ["Single day", "Multi-day availability"], horizontal=True)
+    multi_dia = modo == "Multi-day availability"
     col1, col2, col3 = st.columns(3)
     with col1:
         lat = st.number_input("Latitude", value=None, format="%.6f", placeholder="Ej: 49.877017")
     with col2:
         lon = st.number_input("Longitude", value=None, format="%.6f", placeholder="Ej: -97.047440")
     with col3:
-        fecha_input = st.date_input("Date", value=datetime.now(timezone.utc).date())
+        hoy = datetime.now(timezone.utc).date()
+        if multi_dia:
+            rango = st.date_input("Date range", value=(hoy - timedelta(days=29), hoy))
+        else:
+            fecha_input = st.date_input("Date", value=hoy)
 
-    col4, col5 = st.columns(2)
+    if multi_dia:
+        n_estaciones = st.number_input("Number of nearest stations", 1, 200, 20, 1)
+        if st.button("Search for stations and build availability"):
+            if lat is None or lon is None:
+                st.warning("Please, enter a valid latitude and longitude")
+            elif not isinstance(rango, (tuple, list)) or len(rango) != 2:
+                st.warning("Please, select a start and end date.")
+            else:
+                with st.spinner("Searching for stations and contacting NASA's server..."):
+                    try:
+                        df_cercanas = estaciones_mas_cercanas(lat, lon, df_stations, top_n=n_estaciones)
+                        cubo = disponibilidad_rango(df_cercanas['estacion'], rango[0], rango[1], registro)
+                        cubo.insert(0, "Distance_km", df_cercanas['distancia_km'].round(1).to_numpy())
+                        cubo.insert(1, "Days", cubo.iloc[:, 1:].sum(axis=1))
+                        cubo.columns = cubo.columns.map(str)
+                        st.session_state.availability_cube = cubo
+                        st.success("Availability computed.")
+                    except Exception as e:
+                        st.error(f"An error occurred during verification:: {e}")
+                        st.session_state.availability_cube = None
+
+        if st.session_state.availability_cube is not None:
+            cubo = st.session_state.availability_cube
+            st.subheader("**1s data availability per day**")
+            st.caption(f"{len(cubo)} stations × {cubo.shape[1] - 2} days")
+            st.dataframe(cubo, use_container_width=True)
+        return
+
+    dia_completo = st.checkbox("Full day (00-24 UTC, 96 chunks per station)",
+                               help="Chunks stream through download, conversion and ZIP within fixed disk and "
+                                    "memory budgets, so a full day needs no more temporary space than a few chunks")
+    col4, col5, col6 = st.columns(3)
     with col4:
-        hora_inicio = st.number_input("Start time (UTC)", 0, 23, 0, 1)
+        hora_inicio = st.number_input("Start time (UTC)", 0, 23, 0, 1, disabled=dia_completo)
     with col5:
-        hora_fin = st.number_input("Final time (UTC)", 1, 24, 3, 1)
+        hora_fin = st.number_input("Final time (UTC)", 1, 24, 3, 1, disabled=dia_completo)
+    if dia_completo:
+        hora_inicio, hora_fin = 0, 24
+    with col6:
+        nivel_compresion = st.slider("ZIP compression level", 0, 9, NIVEL_COMPRESION_DEFECTO,
+                                     help="0 = stored (fastest), 9 = smallest file")
+    formato = st.selectbox("Output format", list(FORMATOS_SALIDA), index=list(FORMATOS_SALIDA).index(FORMATO_DEFECTO),
+                           format_func=ETIQUETAS_FORMATO.get,
+                           help="Hatanaka formats skip the conversion and are several times smaller to transfer; "
+                                "open them with CRX2RNX. tar.xz / tar.zst compress all chunks together")
+    # Sin conversión no hay RINEX que empalmar, diezmar ni controlar
+    solo_hatanaka = FORMATOS_SALIDA[formato][0] != "rnx"
+    col7, col8 = st.columns(2)
+    with col7:
+        empalmar = st.checkbox("Splice the 15-minute chunks into one RINEX file per station",
+                               help="One header and continuous epochs for the whole window; missing chunks leave a gap",
+                               disabled=solo_hatanaka)
+    with col8:
+        intervalo_s = st.selectbox("Sampling interval (s)", INTERVALOS_S, index=0,
+                                   help="Epochs off the chosen interval are dropped while converting; "
+                                        "the INTERVAL header is updated", disabled=solo_hatanaka)
+    if solo_hatanaka:
+        empalmar, intervalo_s = False, 1
 
     # --- Paso 2: Botón de Búsqueda y Verificación ---
     if st.button("Search for stations and check availability"):
@@ -60,14 +141,13 @@ def main():
                     # Verificar disponibilidad para estas estaciones
                     fecha_utc = datetime.combine(fecha_input, datetime.min.time(), tzinfo=timezone.utc)
 
-                    summary_raw = descargar_summary(fecha_utc.year)
-                    summary_dict = parsear_summary(summary_raw)
+                    summary = cargar_summary(fecha_utc.year)
                     
                     results = []
                     for _, row in df_cercanas.iterrows():
                         estacion = row['estacion']
-                        disponible, mensaje = verificar_disponibilidad_summary(estacion, fecha_utc, summary_dict, df_stations)
-                        rinex_v = obtener_formato_rinex(estacion, summary_dict) if disponible else None
+                        disponible, mensaje = verificar_disponibilidad_summary(estacion, fecha_utc, summary, registro)
+                        rinex_v = obtener_formato_rinex(estacion, summary) if disponible else None
                         results.append({
                             "Station": estacion,
                             "Distance_km": row['distancia_km'],
@@ -90,9 +170,11 @@ def main():
         
         df_results = st.session_state.verification_results
         
-        # Mostrar tabla de resultados de la verificación
+        # Mostrar tabla de resultados de la verificación (con el control de calidad de lo ya descargado)
         st.subheader("Availability of stations found")
-        st.dataframe(df_results[['Station', 'Distance_km', 'Available', 'Mesagge']], use_container_width=True)
+        tabla = st.empty()
+        columnas = COLUMNAS_RESULTADOS + [c for c in COLUMNAS_QC if c in df_results.columns]
+        tabla.dataframe(df_results[columnas], use_container_width=True)
 
         # Filtrar solo las estaciones que SÍ están disponibles
         estaciones_disponibles = df_results[df_results['Available'] == True]['Station'].tolist()
@@ -113,8 +195,6 @@ def main():
                     st.warning("You must select at least one station to download.")
                 elif hora_fin <= hora_inicio:
                     st.warning("The end time must be greater than the start time.")
-                elif hora_fin - hora_inicio > 3:
-                    st.warning("The interval cannot be more than 3 hours.")
                 else:
                     fecha_dt = datetime.combine(fecha_input, datetime.min.time())
                     for estacion in estaciones_a_descargar:
@@ -122,24 +202,36 @@ def main():
                         rinex_version = df_results.loc[df_results['Station'] == estacion, 'Rinex_version'].iloc[0]
                         
                         st.markdown(f"--- \n#### Processing `{estacion}`...")
-                        with st.spinner(f"Generating ZIP for {estacion}..."):
+                        with st.spinner(f"Generating archive for {estacion}..."):
+                            reporte_qc, qc_empalme = [], []
                             resultado, mensaje, zip_path, temp_dir = download_file_zip(
-                                fecha_dt, estacion, hora_inicio, hora_fin, rinex_version
+                                fecha_dt, estacion, hora_inicio, hora_fin, rinex_version,
+                                nivel_compresion=nivel_compresion, reporte_qc=reporte_qc, empalmar=empalmar,
+                                intervalo_s=intervalo_s, formato=formato, qc_empalme=qc_empalme
                             )
-                            
+
+                            filas_qc = [resumen_qc(qc) for qc in reporte_qc]
+                            if not solo_hatanaka:
+                                for columna, valor in resumen_estacion(filas_qc, (hora_fin - hora_inicio) * 4).items():
+                                    df_results.loc[df_results['Station'] == estacion, columna] = valor
+                            if filas_qc:
+                                with st.expander(f"Data quality of {estacion} ({len(filas_qc)} files)"):
+                                    st.dataframe(filas_qc, hide_index=True, use_container_width=True)
+                                    if qc_empalme:
+                                        st.caption("Spliced file (gaps include missing chunks)")
+                                        st.dataframe([resumen_qc(qc) for qc in qc_empalme], hide_index=True,
+                                                     use_container_width=True)
+
                             if resultado and zip_path:
                                 st.success(f"✅ {mensaje}")
-                                with open(zip_path, "rb") as f:
-                                    st.download_button(
-                                        f" {estacion}",
-                                        data=f,
-                                        file_name=os.path.basename(zip_path),
-                                        mime="application/zip"
-                                    )
+                                # El archivo se sirve desde disco (static/), no desde la memoria de la sesión
+                                mostrar_descarga(zip_path, f"⬇️ {os.path.basename(zip_path)}")
                                 if temp_dir:
                                     temp_dir.cleanup()
                             else:
                                 st.error(f"⚠️ {mensaje}")
+                    columnas = COLUMNAS_RESULTADOS + [c for c in COLUMNAS_QC if c in df_results.columns]
+                    tabla.dataframe(df_results[columnas], use_container_width=True)
 
 # Bloque de ejecución principal
 #if __name__ == "__main__":
@@ -1,17 +1,20 @@
 import requests
-from dotenv import load_dotenv
 import os
+from functools import lru_cache
 
-load_dotenv()  # Carga desde .env
-_USERNAME = os.getenv("NASA_USERNAME")
-_PASSWORD = os.getenv("NASA_PASSWORD")
+@lru_cache(maxsize=1)
+def credenciales_earthdata():
+    # El .env se lee al crear la primera sesión, no al importar el módulo
+    from dotenv import load_dotenv
+    load_dotenv()  # Carga desde .env
+    return os.getenv("NASA_USERNAME"), os.getenv("NASA_PASSWORD")
 
 class SessionWithHeaderRedirection(requests.Session):
     AUTH_HOST = 'urs.earthdata.nasa.gov'
 
     def __init__(self):
         super().__init__()
-        self.auth = (_USERNAME, _PASSWORD)
+        self.auth = credenciales_earthdata()
 
     def rebuild_auth(self, prepared_request, response):
         headers = prepared_request.headers
@@ -0,0 +1,81 @@
+"""
+Disponibilidad de datos de 1 s por estación y por día sobre un rango de fechas.
+
+Los intervalos [Start, End] de los summaries (uno o varios años) se guardan en
+arrays NumPy ordenados por estación; una consulta estaciones × días se resuelve
+con búsquedas binarias y una comparación vectorizada, sin recorrer filas.
+"""
+import numpy as np
+import pandas as pd
+from IGS.sumary_checker import cargar_summary
+
+
+def _dias(fechas) -> np.ndarray:
+    """Fechas (date, datetime, Timestamp con o sin zona) a datetime64[D]."""
+    indice = pd.DatetimeIndex(pd.to_datetime(list(fechas) if not isinstance(fechas, pd.Index) else fechas))
+    if indice.tz is not None:
+        indice = indice.tz_convert("UTC").tz_localize(None)
+    return indice.to_numpy().astype("datetime64[D]")
+
+
+def _codigos(estaciones) -> np.ndarray:
+    return np.array([str(e)[:4].upper() for e in estaciones], dtype="U4")
+
+
+class IndiceDisponibilidad:
+    """
+    Intervalos del summary ordenados por (estación, inicio).
+    Cada estación ocupa un tramo contiguo de los arrays, localizado con searchsorted.
+    """
+
+    def __init__(self, summaries):
+        tablas = [s for s in summaries if s is not None and not s.empty]
+        if tablas:
+            codigos = np.concatenate([_codigos(t["Site"].astype(str)) for t in tablas])
+            inicios = np.concatenate([_dias(t["Start"]) for t in tablas])
+            fines = np.concatenate([_dias(t["End"]) for t in tablas])
+        else:
+            codigos = np.empty(0, dtype="U4")
+            inicios = fines = np.empty(0, dtype="datetime64[D]")
+        orden = np.lexsort((inicios, codigos))
+        self.codigos = codigos[orden]
+        self.inicios = inicios[orden]
+        self.fines = fines[orden]
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def cubo(self, estaciones, dias) -> np.ndarray:
+        """Matriz booleana (estaciones × días): True si algún intervalo de la estación cubre el día."""
+        codigos = _codigos(estaciones)
+        dias = _dias(dias)
+        izquierda = np.searchsorted(self.codigos, codigos, side="left")
+        derecha = np.searchsorted(self.codigos, codigos, side="right")
+        cantidades = derecha - izquierda
+
+        # Intervalos de todas las estaciones pedidas, con la fila de salida a la que pertenecen
+        filas = np.repeat(np.arange(len(codigos)), cantidades)
+        intervalos = np.repeat(izquierda - np.cumsum(cantidades) + cantidades, cantidades) + np.arange(cantidades.sum())
+        cubre = (self.inicios[intervalos, None] <= dias[None, :]) & (dias[None, :] <= self.fines[intervalos, None])
+
+        resultado = np.zeros((len(codigos), len(dias)), dtype=bool)
+        np.logical_or.at(resultado, filas, cubre)
+        return resultado
+
+
+def disponibilidad_rango(estaciones, fecha_inicio, fecha_fin, registro=None, summaries=None) -> pd.DataFrame:
+    """
+    Disponibilidad de 1 s para cada estación y cada día de [fecha_inicio, fecha_fin].
+    Carga el summary de cada año del rango (salvo que se pasen 'summaries') y, con
+    'registro' (catálogo IGS), descarta las estaciones sin 'Rate 1s'.
+    Devuelve un DataFrame booleano: filas = estaciones, columnas = fechas.
+    """
+    dias = pd.date_range(pd.Timestamp(fecha_inicio).date(), pd.Timestamp(fecha_fin).date(), freq="D")
+    if summaries is None:
+        summaries = [cargar_summary(anio) for anio in sorted(set(dias.year))]
+    estaciones = list(estaciones)
+    cubo = IndiceDisponibilidad(summaries).cubo(estaciones, dias)
+    if registro is not None:
+        con_rate = registro.codigos_con("rate 1s")
+        cubo &= np.isin(_codigos(estaciones), list(con_rate))[:, None]
+    return pd.DataFrame(cubo, index=pd.Index(estaciones, name="Station"), columns=dias.date)
@@ -1,23 +1,22 @@
 import pandas as pd
 import streamlit as st
 
-def mostrar_info_estacion_resumida(sitename, summary_dict, csv_df):
-    csv_df.columns = csv_df.columns.str.strip()
+def mostrar_info_estacion_resumida(sitename, summary, registro):
     codigo = sitename[:4].upper()
-    fila = csv_df[csv_df["estacion"].str.startswith(codigo)]
-    if fila.empty:
+    fila = registro.fila(codigo)
+    if fila is None:
         st.warning("No information was found in the local CSV.")
         return
-    version_rinex = summary_dict.get(codigo, {}).get("Format", "N/A")
+    version_rinex = summary.at[codigo, "Format"] if codigo in summary.index else "N/A"
 
-    agencia = fila["agencies"].values[0] if "agencies" in fila.columns else "N/A"
-    constelaciones = fila["satellite system"].values[0] if "satellite system" in fila.columns else "N/A"
+    agencia = fila.get("agencies", "N/A")
+    constelaciones = fila.get("satellite system", "N/A")
     resumen = pd.DataFrame([{
         "ID Station": codigo,
-        "Name complete": fila["estacion"].values[0],
-        "Approximate Position": f"{fila['latitud'].values[0]}, {fila['longitud'].values[0]}",
+        "Name complete": fila["estacion"],
+        "Approximate Position": f"{fila['latitud']:.6f}, {fila['longitud']:.6f}",
         "RINEX Version": version_rinex,
-        "Interval (1s)": fila["rate 1s"].values[0],
+        "Interval (1s)": "SI" if fila["rate 1s"] else "NO",
         "Agencies": agencia,
         "Constellations": constelaciones
     }])
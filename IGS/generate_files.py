@@ -1,44 +1,67 @@
-import shutil
-import subprocess
-import gzip
+import os
+from functools import lru_cache
+import threading
+import multiprocessing
 import requests
-import pandas as pd
-from geopy.distance import geodesic
-from zipfile import ZipFile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from tempfile import TemporaryDirectory
 from IGS.generate_date import calculate_date, is_within_range
 from IGS.authenticator import SessionWithHeaderRedirection
 from IGS.sumary_checker import cargar_estaciones_tipo_S
+from IGS.hatanaka import ErrorHatanaka, crx_a_rnx
+from common.spatial_index import estaciones_cercanas
+from common.http_cache import descargar_directo
+from common.streaming import descomprimir_respuesta
+from common.archive import EXTENSIONES, NIVEL_COMPRESION_DEFECTO, abrir_contenedor
+from common.rinex import EmpalmeRinex, ErrorRinex, codigo_muestreo, estadisticas_rinex
 from typing import Optional
 
-estaciones_tipo_S = cargar_estaciones_tipo_S()
-
-def load_df(path_archivo: str) -> pd.DataFrame:
-    df = pd.read_csv(path_archivo, sep=",", header=0)
-    df.columns = df.columns.str.strip().str.lower()
-    df.rename(columns={
-        "latitude": "latitud",
-        "longitude": "longitud",
-        "site name": "estacion"
-    }, inplace=True)
-    return df
-
-def estaciones_mas_cercanas(latitud, longitud, df, top_n=2):
-    ubicacion_usuario = (latitud, longitud)
-    df["distancia_km"] = df.apply(
-        lambda row: geodesic(ubicacion_usuario, (row["latitud"], row["longitud"])).kilometers,
-        axis=1
-    )
-    df_ordenado = df.sort_values("distancia_km")
-    return df_ordenado.head(top_n)
+# Concurrencia del pipeline: descargas (red) y conversión (un proceso por núcleo)
+WORKERS_DESCARGA = 4
+WORKERS_CONVERSION = os.cpu_count() or 1
+# Duración nominal de cada bloque de alta tasa (15M_01S): base de la completitud del control de calidad
+DURACION_BLOQUE_S = 900
+# Presupuestos de los intermedios del pipeline (CRX + RNX de los bloques en curso, no el ZIP final).
+# Acotan cuántos bloques avanzan a la vez: el día completo (96 bloques) ocupa lo mismo que unos pocos.
+# El de disco se aplica con la huella medida de cada bloque; el de memoria es nominal: se divide
+# por MEMORIA_POR_BLOQUE_MB, una estimación fija (no se mide la memoria de los procesos)
+PRESUPUESTO_DISCO_MB = 512
+PRESUPUESTO_MEMORIA_MB = 512
+HUELLA_INICIAL_MB = 64        # CRX + RNX de un bloque de 15 min a 1 s multi-GNSS, hasta medir el primero
+MEMORIA_POR_BLOQUE_MB = 48    # estimación: búferes de descarga y proceso de conversión/control por bloque
+# Formato de salida -> (contenido de cada bloque, contenedor). 'crx' y 'crx.gz' no convierten:
+# se entregan los bloques Hatanaka tal cual (sin control de calidad, empalme ni diezmado)
+FORMATOS_SALIDA = {
+    "rnx.zip": ("rnx", "zip"),
+    "crx.zip": ("crx", "zip"),
+    "crx.gz.zip": ("crx.gz", "zip"),
+    "rnx.tar.xz": ("rnx", "xz"),
+    "rnx.tar.zst": ("rnx", "zst"),
+}
+FORMATO_DEFECTO = "rnx.zip"
+_POOL_CONVERSION = None
+_LOCK_POOL = threading.Lock()
+
+@lru_cache(maxsize=1)
+def estaciones_tipo_S():
+    """Estaciones con archivos de tipo 'S' (data/stations_s.csv), leídas en el primer uso."""
+    return frozenset(cargar_estaciones_tipo_S())
+
+def estaciones_mas_cercanas(latitud, longitud, df, top_n=2, radio_km=None):
+    df_cercanas, distancias = estaciones_cercanas(df, latitud, longitud, "latitud", "longitud", top_n, radio_km)
+    df_cercanas["distancia_km"] = distancias
+    return df_cercanas
 
 def obtener_vinculos(anio: int, doy: str, sitename: str, hora_inicio: int = 0, hora_fin: int = 23, rinex_version="3"):
     urls = []
     estacion_corto = sitename[:4].lower()
     yy = str(anio)[2:]
-    tipo_archivo = "S" if rinex_version == "3" and estacion_corto in estaciones_tipo_S else "R"
+    # data/stations_s.csv guarda el nombre largo en mayúsculas (ABMF00GLP)
+    tipo_archivo = "S" if rinex_version == "3" and sitename.upper() in estaciones_tipo_S() else "R"
 
     for hora in range(hora_inicio, hora_fin):
         for minuto in range(0, 60, 15):
@@ -55,129 +78,265 @@ def obtener_vinculos(anio: int, doy: str, sitename: str, hora_inicio: int = 0, h
             urls.append((url, nombre_archivo))
     return urls
 
-# insertar funcion de ruta ejecutable
-def obtener_ruta_ejecutable(directorio_base: str = "data") -> Optional[Path]:
-    ruta = Path(directorio_base) / "CRX2RNX.exe"
-    if not ruta.exists():
-        print(f"No se encontró 'CRX2RNX.exe' en la carpeta '{directorio_base}'.")
-        return None
-    return ruta
+def ruta_rinex_salida(ruta_crx: Path, rinex_version="3", intervalo_s=1) -> Path:
+    # Lógica para determinar el nombre de salida
+    if rinex_version == "2":
+        yy = ruta_crx.name.split('.')[-1][0:2]
+        return ruta_crx.with_suffix(f".{yy}o")
+    # El nombre largo declara el muestreo: tras diezmar, '_01S_' pasa a '_30S_', etc.
+    return ruta_crx.with_name(ruta_crx.name.replace("_01S_", f"_{codigo_muestreo(intervalo_s)}_")).with_suffix(".rnx")
 
-# ---  descomprimir_crx_gz  ---
-def descomprimir_crx_gz(ruta_archivo_gz):
-    ruta_crx = ruta_archivo_gz.with_suffix("")
-    if ruta_crx.exists():
-        ruta_crx.unlink()
-    try:
-        with gzip.open(ruta_archivo_gz, 'rb') as f_in:
-            with open(ruta_crx, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        return ruta_crx
-    except Exception as e:
-        print(f"Error al descomprimir {ruta_archivo_gz.name}: {e}")
-        return None
+def nombre_empalmado(nombre_bloque: str, hora_inicio: int, hora_fin: int, rinex_version="3", intervalo_s=1) -> str:
+    """
+    Nombre del RINEX unido a partir del nombre del primer bloque de 15 min:
+    RINEX 3 -> 'XXXX00CCC_S_YYYYDDDHH00_03H_01S_MO.rnx' ('_01D_' para el día completo);
+    RINEX 2 -> 'xxxxddd' + sesión + '.yyo', con sesión '0' para el día completo y la
+    letra de la hora inicial en otro caso (el nombre corto no admite varias horas).
+    """
+    horas = hora_fin - hora_inicio
+    if rinex_version == "2":
+        estacion_doy = nombre_bloque[:7]
+        yy = nombre_bloque.split(".")[-2][:2] if nombre_bloque.endswith(".gz") else nombre_bloque.split(".")[-1][:2]
+        sesion = "0" if horas == 24 else chr(ord('a') + hora_inicio)
+        return f"{estacion_doy}{sesion}.{yy}o"
+    sitio, tipo, inicio = nombre_bloque.split("_")[:3]
+    periodo = "01D" if horas == 24 else f"{horas:02d}H"
+    return f"{sitio}_{tipo}_{inicio[:7]}{hora_inicio:02d}00_{periodo}_{codigo_muestreo(intervalo_s)}_MO.rnx"
 
-# modificar convertir_a_rnx para que reciba la ruta ---
-def convertir_a_rnx(ruta_crx: Path, ruta_ejecutable: Path, rinex_version="3"):
+def bloques_en_vuelo(presupuesto_disco_mb, presupuesto_memoria_mb, huella_mb, maximo) -> int:
+    """Bloques que pueden estar a la vez entre descarga y ZIP sin exceder ningún presupuesto (al menos 1)."""
+    por_disco = int(presupuesto_disco_mb // max(huella_mb, 1e-3))
+    por_memoria = int(presupuesto_memoria_mb // MEMORIA_POR_BLOQUE_MB)
+    return max(1, min(por_disco, por_memoria, maximo))
 
-    try:
-        # Lógica para determinar el nombre de salida
-        if rinex_version == "2":
-            yy = ruta_crx.name.split('.')[-1][0:2]
-            ruta_convertida = ruta_crx.with_suffix(f".{yy}o")
-        else:
-            ruta_convertida = ruta_crx.with_suffix(".rnx")
-
-        if ruta_convertida.exists():
-            ruta_convertida.unlink()
-
-        comando = [str(ruta_ejecutable), "-f", str(ruta_crx)] # setear ruta
-
-        result = subprocess.run(
-            comando,
-            cwd=ruta_crx.parent,
-            capture_output=True,
-            text=True,
-            shell=False,
-            check=False
-        )
-        if result.returncode == 0:
-            if ruta_convertida.exists():
-                return ruta_convertida
-            else:
-                print(f"CRX2RNX ejecutado, pero no se encontró: {ruta_convertida.name}")
-        else:
-            print(f"Error en CRX2RNX ({ruta_crx.name}):\n{result.stderr}")
-    except Exception as e:
-        print(f"Excepción al ejecutar CRX2RNX: {e}")
-    return None
+def _nueva_sesion():
+    session = SessionWithHeaderRedirection()
+    session.headers.update({"User-Agent": "Mozilla/5.0"})
+    return session
 
-# añadir funcion
-def download_file_zip(fecha, estacion, hora_inicio=0, hora_fin=24, rinex_version="3"):
-    ruta_exe = obtener_ruta_ejecutable() #obtener la ruta del ejecutable AL PRINCIPIO.
-    if not ruta_exe:
-        return False, "Proceso fallido: El ejecutable CRX2RNX.exe no fue encontrado.", None, None
+def _pool_conversion() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido para la conversión CRX -> RNX (CPU), creado una vez.
+    Usa 'spawn': el servidor de Streamlit tiene hilos y en Windows es el único modo.
+    """
+    global _POOL_CONVERSION
+    with _LOCK_POOL:
+        if _POOL_CONVERSION is None:
+            _POOL_CONVERSION = ProcessPoolExecutor(
+                max_workers=WORKERS_CONVERSION, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _POOL_CONVERSION
 
+def _en_pool_conversion(funcion, *args):
+    """
+    Ejecuta 'funcion' en el pool de conversión y espera el resultado. Si un proceso
+    murió (BrokenProcessPool, p. ej. por falta de memoria), el pool roto se
+    reemplaza por uno nuevo y se reintenta una vez.
+    """
+    global _POOL_CONVERSION
+    for intento in range(2):
+        pool = _pool_conversion()
+        try:
+            return pool.submit(funcion, *args).result()
+        except BrokenProcessPool:
+            with _LOCK_POOL:
+                if _POOL_CONVERSION is pool:
+                    _POOL_CONVERSION = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            if intento:
+                raise
+            print("Pool de conversión roto: se crea uno nuevo.")
+
+def _bytes_intermedios(carpeta: Path, salida: Path) -> int:
+    """Espacio de los CRX/RNX en curso dentro de la carpeta temporal (sin contar el archivo de salida)."""
+    total = 0
+    for entrada in os.scandir(carpeta):
+        if entrada.is_file() and not entrada.name.startswith(salida.name):
+            total += entrada.stat().st_size
+    return total
+
+# añadir funcion
+def download_file_zip(fecha, estacion, hora_inicio=0, hora_fin=24, rinex_version="3",
+                      workers_descarga=WORKERS_DESCARGA, nivel_compresion=NIVEL_COMPRESION_DEFECTO,
+                      reporte_qc: Optional[list] = None, empalmar=False,
+                      presupuesto_disco_mb=PRESUPUESTO_DISCO_MB, presupuesto_memoria_mb=PRESUPUESTO_MEMORIA_MB,
+                      intervalo_s=1, formato=FORMATO_DEFECTO, qc_empalme: Optional[list] = None):
+    """
+    Descarga, convierte y comprime en un ZIP los bloques de 15 min de la estación.
+    Cada RINEX pasa un control de calidad (common.rinex) antes de entrar al ZIP:
+    los bloques sin épocas no se incluyen. Si se pasa 'reporte_qc', se le añaden
+    las estadísticas de cada bloque en orden temporal.
+    Con 'empalmar', los bloques se unen en flujo, a medida que llegan, en un único
+    RINEX con una sola cabecera para todo [hora_inicio, hora_fin), escrito
+    directamente dentro del ZIP. Su control de calidad (medido al escribirlo, con
+    los huecos de los bloques que faltan) se añade a 'qc_empalme' y al mensaje.
+    Los bloques avanzan en una ventana deslizante acotada por los presupuestos de
+    disco (con la huella por bloque medida sobre la marcha) y memoria (nominal,
+    MEMORIA_POR_BLOQUE_MB por bloque). Los bloques se descargan sin caché HTTP y
+    cada intermedio se borra en cuanto se consume: un día completo no ocupa más
+    que unos pocos bloques además del ZIP.
+    Con 'intervalo_s' > 1 la conversión deja solo las épocas de esa malla (5 s, 30 s...)
+    y corrige el INTERVAL de la cabecera: el ZIP se reduce en la misma proporción.
+    'formato' (FORMATOS_SALIDA) elige qué se entrega: RINEX en ZIP (por defecto), los
+    bloques Hatanaka sin convertir ('crx.zip', o los .crx.gz originales del servidor en
+    'crx.gz.zip', en un ZIP sin compresión adicional) o RINEX en un tar comprimido con xz o zstd.
+    En tar, el archivo empalmado pasa por disco antes de entrar al contenedor.
+    """
     en_rango, dias_diff = is_within_range(fecha)
     if not en_rango:
         return False, f"⚠️ La fecha tiene {dias_diff} días de antigüedad (máx 182).", None, None
+    if formato not in FORMATOS_SALIDA:
+        return False, f"Formato de salida desconocido: {formato}", None, None
+    contenido, compresion = FORMATOS_SALIDA[formato]
+    if contenido != "rnx" and (empalmar or intervalo_s > 1):
+        return False, "El empalme y el diezmado requieren RINEX: no se aplican a los formatos Hatanaka.", None, None
 
     anio, mes, dia = fecha.year, fecha.month, fecha.day
     doy = str(calculate_date(anio, mes, dia)).zfill(3)
 
-    session = SessionWithHeaderRedirection()
-    session.headers.update({"User-Agent": "Mozilla/5.0"})
-
     vinculos = obtener_vinculos(anio, doy, estacion, hora_inicio, hora_fin, rinex_version)
 
     temp_dir = TemporaryDirectory()
     carpeta_salida = Path(temp_dir.name)
 
-    archivos_rnx = []
-    print(f"\nIniciando descarga para la estación {estacion}...")
-    
-    for url, archivo in vinculos:
-        ruta_gz = carpeta_salida / archivo
+    # Una sesión por hilo: requests.Session no es segura entre hilos
+    sesiones = threading.local()
+
+    def descargar(url, archivo):
+        if not hasattr(sesiones, "session"):
+            sesiones.session = _nueva_sesion()
+        # El .gz se descomprime en flujo a la carpeta temporal; sus bytes comprimidos solo
+        # quedan en un parcial (para reanudar) mientras dura la descarga. En 'crx.gz' se
+        # guardan tal cual: son los mismos bytes (y MD5) que publica CDDIS
+        ruta_crx = carpeta_salida / (archivo if contenido == "crx.gz" else archivo.removesuffix(".gz"))
         try:
-            r = session.get(url, stream=True, timeout=30)
-            if r.status_code != 200:
-                print(f"-> Fallo en URL (Status {r.status_code}): {url}")
-                continue
+            # Sin caché HTTP: un día completo la llenaría y desalojaría summaries y MD5SUMS
+            if contenido == "crx.gz":
+                descargar_directo(url, ruta_crx, sesiones.session)
+            else:
+                descargar_directo(url, ruta_crx, sesiones.session, escribir=descomprimir_respuesta)
 
-            with open(ruta_gz, "wb") as f:
-                f.write(r.content)
-            
             print(f"-> Descargado: {archivo}")
-            
-            ruta_crx = descomprimir_crx_gz(ruta_gz)
-            if not ruta_crx:
-                continue
+            return ruta_crx
+        except requests.HTTPError as e:
+            print(f"-> Fallo en URL (Status {e.response.status_code}): {url}")
+        except Exception as e:
+            print(f"Error inesperado descargando {archivo}: {e}")
+        return None
 
-            #  la ruta del ejecutable a la función de conversión.
-            ruta_rnx = convertir_a_rnx(ruta_crx, ruta_exe, rinex_version)
-            
-            if ruta_rnx and ruta_rnx.exists():
-                archivos_rnx.append(ruta_rnx)
-                if ruta_crx.exists(): ruta_crx.unlink()
-            
-            if ruta_gz.exists(): ruta_gz.unlink()
+    limite_descargas = threading.Semaphore(workers_descarga)
 
+    def procesar(url, archivo):
+        # Descarga (a lo sumo 'workers_descarga' a la vez), conversión y control de un bloque
+        with limite_descargas:
+            ruta_crx = descargar(url, archivo)
+        if ruta_crx is None:
+            return None
+        bytes_crx = ruta_crx.stat().st_size
+        if contenido != "rnx":
+            # El bloque Hatanaka (.crx, o el .crx.gz del servidor) va tal cual al contenedor
+            return ruta_crx, ruta_crx, None, bytes_crx
+        try:
+            # La conversión arranca en cuanto el archivo llega, mientras siguen las descargas
+            ruta_rnx = _en_pool_conversion(crx_a_rnx, ruta_crx, ruta_rinex_salida(ruta_crx, rinex_version, intervalo_s),
+                                           intervalo_s)
+            qc = _en_pool_conversion(estadisticas_rinex, ruta_rnx, DURACION_BLOQUE_S)
+            return ruta_crx, ruta_rnx, qc, bytes_crx
         except Exception as e:
-            print(f"Error inesperado procesando {archivo}: {e}")
+            return ruta_crx, e, None, bytes_crx
+        finally:
+            # El CRX ya no hace falta una vez convertido
+            ruta_crx.unlink(missing_ok=True)
 
-    if not archivos_rnx:
+    zip_path = carpeta_salida / f"{estacion}_{fecha.strftime('%Y%m%d')}{EXTENSIONES[compresion]}"
+    print(f"\nIniciando descarga para la estación {estacion}...")
+    maximo_en_vuelo = 2 * (workers_descarga + WORKERS_CONVERSION)
+    huella_mb = 0.0
+    pico_intermedios = 0
+    empalme = None
+    try:
+        # Los .crx.gz ya van comprimidos: se guardan en el ZIP sin deflate
+        archivo_zip = abrir_contenedor(zip_path, compresion, 0 if contenido == "crx.gz" else nivel_compresion)
+    except RuntimeError as e:
         temp_dir.cleanup()
-        return False, "No se pudo descargar o convertir ningún archivo.", None, None
-
-    zip_path = carpeta_salida / f"{estacion}_{fecha.strftime('%Y%m%d')}.zip"
-    with ZipFile(zip_path, "w") as zipf:
-        for archivo_rnx in archivos_rnx:
-            zipf.write(archivo_rnx, arcname=archivo_rnx.name)
-
-    return True, f"Archivos descargados y convertidos ({len(archivos_rnx)}).", zip_path, temp_dir
-
-
-
+        return False, str(e), None, None
+    # El contenedor se escribe a medida que terminan conversión y control, en el orden temporal de los vínculos
+    with ThreadPoolExecutor(max_workers=maximo_en_vuelo) as pool, archivo_zip:
+        if empalmar and vinculos:
+            inicio_ventana = datetime(anio, mes, dia, hora_inicio)
+            nombre = nombre_empalmado(vinculos[0][1], hora_inicio, hora_fin, rinex_version, intervalo_s)
+            # En ZIP el empalme se escribe dentro de la entrada; en tar, en disco y se agrega al cerrar
+            empalme = EmpalmeRinex(carpeta_salida / nombre, inicio_ventana,
+                                   inicio_ventana + timedelta(hours=hora_fin - hora_inicio),
+                                   abrir=(lambda: archivo_zip.abrir(nombre)) if compresion == "zip" else None)
+        pendientes = iter(vinculos)
+        en_vuelo = deque()
+        while True:
+            # Ventana deslizante: solo entran bloques nuevos mientras quepan en los presupuestos
+            ventana = bloques_en_vuelo(presupuesto_disco_mb, presupuesto_memoria_mb, huella_mb or HUELLA_INICIAL_MB,
+                                       maximo_en_vuelo)
+            while len(en_vuelo) < ventana and (vinculo := next(pendientes, None)) is not None:
+                en_vuelo.append(pool.submit(procesar, *vinculo))
+            if not en_vuelo:
+                break
+            resultado = en_vuelo.popleft().result()
+            if resultado is None:
+                continue
+            ruta_crx, ruta_rnx, qc, bytes_crx = resultado
+            try:
+                if isinstance(ruta_rnx, Exception):
+                    raise ruta_rnx
+                # Huella medida del bloque: el mayor visto gobierna la ventana
+                pico_intermedios = max(pico_intermedios, _bytes_intermedios(carpeta_salida, zip_path))
+                bytes_salida = ruta_rnx.stat().st_size if ruta_rnx != ruta_crx else 0
+                huella_mb = max(huella_mb, (bytes_crx + bytes_salida) / 1024 ** 2)
+                if qc is None:
+                    # Formatos Hatanaka: sin conversión no hay control de calidad
+                    archivo_zip.agregar(ruta_rnx)
+                    continue
+                if reporte_qc is not None:
+                    reporte_qc.append(qc)
+                if qc["epocas"] == 0:
+                    print(f"Bloque sin épocas, no se incluye: {ruta_rnx.name}")
+                    continue
+                if empalme is None:
+                    archivo_zip.agregar(ruta_rnx)
+                    continue
+                try:
+                    empalme.agregar(ruta_rnx)
+                except ErrorRinex as e:
+                    print(f"Bloque no empalmado: {e}")
+            except ErrorHatanaka as e:
+                print(f"Error en la conversión Hatanaka ({ruta_crx.name}): {e}")
+            except Exception as e:
+                print(f"Excepción al convertir {ruta_crx.name}: {e}")
+            finally:
+                if not isinstance(ruta_rnx, Exception):
+                    ruta_rnx.unlink(missing_ok=True)
 
+        if empalme is not None:
+            # Los bloques que faltan solo dejan huecos en el archivo unido
+            empalme.cerrar()
+            if empalme.epocas and compresion != "zip":
+                archivo_zip.agregar(empalme.destino)
+            if empalme.epocas:
+                print(f"-> {empalme.archivos} bloques unidos en {empalme.destino.name} ({empalme.epocas} épocas)")
+                estadisticas_empalme = empalme.estadisticas((hora_fin - hora_inicio) * 3600)
+                if qc_empalme is not None:
+                    qc_empalme.append(estadisticas_empalme)
+    print(f"-> Pico de intermedios en disco: {pico_intermedios / 1024 ** 2:.1f} MB "
+          f"(presupuesto {presupuesto_disco_mb} MB)")
 
+    if empalme is not None and not empalme.epocas:
+        temp_dir.cleanup()
+        return False, "No se pudo descargar o convertir ningún archivo.", None, None
+    if not archivo_zip.archivos:
+        temp_dir.cleanup()
+        return False, "No se pudo descargar o convertir ningún archivo.", None, None
 
+    accion = "descargados y convertidos" if contenido == "rnx" else "descargados"
+    mensaje = f"Archivos {accion} ({archivo_zip.archivos})."
+    if empalme is not None:
+        mensaje += (f" Empalme: {estadisticas_empalme['epocas']} épocas, {estadisticas_empalme['huecos']} huecos, "
+                    f"{100 * estadisticas_empalme['completitud']:.1f} % de la ventana.")
+    return True, mensaje, zip_path, temp_dir
@@ -0,0 +1,253 @@
+"""
+Decodificador Hatanaka (Compact RINEX 1.0 / 3.0 -> RINEX 2 / 3) en Python.
+
+Reemplaza la llamada a CRX2RNX: recorre el archivo línea a línea, reconstruye
+las diferencias de orden n de cada observable y escribe la observación RINEX
+sin cargar el archivo completo en memoria.
+"""
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from common.rinex import diezmar
+
+
+class ErrorHatanaka(ValueError):
+    """El contenido no es Compact RINEX válido."""
+
+
+def _reparar(anterior: str, diferencia: str) -> str:
+    """Aplica una diferencia de texto: ' ' conserva, '&' borra, otro carácter reemplaza."""
+    if len(diferencia) > len(anterior):
+        anterior = anterior.ljust(len(diferencia))
+    caracteres = list(anterior)
+    for i, c in enumerate(diferencia):
+        if c != " ":
+            caracteres[i] = " " if c == "&" else c
+    return "".join(caracteres)
+
+
+def _nuevo_arco(campo: str) -> list:
+    """'n&valor' inicia un arco de orden n: [orden, valor, Δ1, Δ2, ...]."""
+    orden, valor = campo.split("&")
+    return [int(orden), int(valor)]
+
+
+def _avanzar_arco(arco: list, diferencia: int) -> int:
+    """Recupera el siguiente valor a partir de la diferencia de mayor orden disponible."""
+    almacenadas = len(arco) - 1
+    m = min(almacenadas, arco[0])
+    if m == almacenadas:
+        arco.append(diferencia)
+    else:
+        arco[m + 1] = diferencia
+    for k in range(m, 0, -1):
+        arco[k] += arco[k + 1]
+    return arco[1]
+
+
+def _formatear_entero(valor: int, decimales: int, ancho: int) -> str:
+    """
+    Entero escalado a texto con punto decimal fijo (evita redondeos de coma flotante).
+    Igual que CRX2RNX, los valores menores que 1 se escriben sin el cero: '-.123'.
+    """
+    entero, fraccion = divmod(abs(valor), 10 ** decimales)
+    texto = f"{'-' if valor < 0 else ''}{entero or ''}.{fraccion:0{decimales}d}"
+    return texto.rjust(ancho)
+
+
+def _separar_campos(linea: str, n_tipos: int):
+    """Separa los n campos de datos y la cadena de banderas LLI/SSI de una línea de satélite."""
+    partes = linea.split(" ", n_tipos)
+    if len(partes) > n_tipos:
+        return partes[:n_tipos], partes[n_tipos]
+    return partes + [""] * (n_tipos - len(partes)), ""
+
+
+def _siguiente(lineas: Iterator[str]) -> str:
+    try:
+        return next(lineas)
+    except StopIteration:
+        raise ErrorHatanaka("Archivo Compact RINEX truncado.") from None
+
+
+def _leer_tipos(cabecera: list, version_rinex: int) -> dict:
+    """Número de observables por sistema ('' para RINEX 2, donde es global)."""
+    tipos = {}
+    sistema = None
+    for linea in cabecera:
+        etiqueta = linea[60:].strip()
+        if version_rinex == 2 and etiqueta == "# / TYPES OF OBSERV":
+            if linea[:6].strip():
+                tipos[""] = int(linea[:6])
+        elif version_rinex == 3 and etiqueta == "SYS / # / OBS TYPES":
+            if linea[0] != " ":
+                sistema = linea[0]
+                tipos[sistema] = int(linea[3:6])
+    if not tipos:
+        raise ErrorHatanaka("La cabecera no define tipos de observación.")
+    return tipos
+
+
+class _Decodificador:
+    def __init__(self, version_crx: int, tipos: dict):
+        self.version = version_crx
+        self.tipos = tipos
+        self.epoca = ""
+        self.reloj = None
+        self.arcos = {}
+        self.banderas = {}
+        self.satelites_previos = set()
+        # Posiciones de la línea de época según la versión
+        if version_crx == 1:
+            self.col_bandera, self.col_nsat, self.col_sats = 28, slice(29, 32), 32
+        else:
+            self.col_bandera, self.col_nsat, self.col_sats = 31, slice(32, 35), 41
+
+    def _linea_epoca(self, linea: str) -> str:
+        inicio = "&" if self.version == 1 else ">"
+        if linea.startswith(inicio):
+            self.epoca = linea
+        else:
+            self.epoca = _reparar(self.epoca, linea)
+        return self.epoca.rstrip()
+
+    def _leer_reloj(self, linea: str):
+        if not linea.strip():
+            self.reloj = None
+            return None
+        if "&" in linea:
+            self.reloj = _nuevo_arco(linea.strip())
+            return self.reloj[1]
+        if self.reloj is None:
+            raise ErrorHatanaka("Diferencia de reloj sin inicialización.")
+        return _avanzar_arco(self.reloj, int(linea))
+
+    def _datos_satelite(self, sat: str, linea: str):
+        n_tipos = self.tipos.get("" if self.version == 1 else sat[0])
+        if n_tipos is None:
+            raise ErrorHatanaka(f"Sistema sin tipos de observación: {sat}")
+        arcos = self.arcos.setdefault(sat, [None] * n_tipos)
+        if sat not in self.satelites_previos:
+            self.banderas[sat] = ""
+        campos, dif_banderas = _separar_campos(linea, n_tipos)
+        valores = []
+        for i, campo in enumerate(campos):
+            if not campo:
+                arcos[i] = None
+                valores.append(None)
+            elif "&" in campo:
+                arcos[i] = _nuevo_arco(campo)
+                valores.append(arcos[i][1])
+            elif arcos[i] is None:
+                raise ErrorHatanaka(f"Diferencia sin inicialización para {sat}.")
+            else:
+                valores.append(_avanzar_arco(arcos[i], int(campo)))
+        banderas = list(_reparar(self.banderas[sat], dif_banderas).ljust(2 * n_tipos))
+        # Un observable ausente deja sus banderas en blanco, también como referencia
+        for i, valor in enumerate(valores):
+            if valor is None:
+                banderas[2 * i:2 * i + 2] = "  "
+        banderas = "".join(banderas)
+        self.banderas[sat] = banderas
+        return valores, banderas
+
+    def _observaciones(self, valores, banderas):
+        for i, valor in enumerate(valores):
+            texto = " " * 14 if valor is None else _formatear_entero(valor, 3, 14)
+            yield texto + banderas[2 * i:2 * i + 2]
+
+    def decodificar(self, lineas: Iterator[str]) -> Iterator[str]:
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            epoca = self._linea_epoca(linea)
+            bandera = epoca[self.col_bandera] if len(epoca) > self.col_bandera else "0"
+            n_sat = int(epoca[self.col_nsat].strip() or 0)
+
+            if bandera not in "01":
+                # Evento: la época y sus registros van tal cual
+                yield epoca.replace("&", " ", 1) if self.version == 1 else epoca
+                for _ in range(n_sat):
+                    yield _siguiente(lineas)
+                # Tras un evento las banderas de todos los satélites se reinician
+                self.satelites_previos = set()
+                continue
+
+            reloj = self._leer_reloj(_siguiente(lineas))
+            lista = epoca[self.col_sats:self.col_sats + 3 * n_sat].ljust(3 * n_sat)
+            satelites = [lista[i:i + 3] for i in range(0, 3 * n_sat, 3)]
+
+            if self.version == 1:
+                cabeza = " " + epoca[1:self.col_sats].ljust(self.col_sats - 1)
+                primera = cabeza + lista[:36]
+                if reloj is not None:
+                    yield primera.ljust(68) + _formatear_entero(reloj, 9, 12)
+                else:
+                    yield primera.rstrip()
+                for i in range(36, len(lista), 36):
+                    yield (" " * 32 + lista[i:i + 36]).rstrip()
+            else:
+                cabeza = epoca[:35]
+                if reloj is not None:
+                    yield cabeza.ljust(41) + _formatear_entero(reloj, 12, 15)
+                else:
+                    yield cabeza.rstrip()
+
+            for sat in satelites:
+                valores, banderas = self._datos_satelite(sat, _siguiente(lineas))
+                observaciones = list(self._observaciones(valores, banderas))
+                if self.version == 1:
+                    for i in range(0, max(len(observaciones), 1), 5):
+                        yield "".join(observaciones[i:i + 5]).rstrip()
+                else:
+                    yield (sat + "".join(observaciones)).rstrip()
+            self.satelites_previos = set(satelites)
+
+
+def decodificar_crx(lineas: Iterable[str]) -> Iterator[str]:
+    """
+    Genera las líneas RINEX (sin salto de línea) correspondientes a un flujo
+    de líneas Compact RINEX.
+    """
+    lineas = (linea.rstrip("\r\n") for linea in lineas)
+    try:
+        primera = next(lineas)
+        next(lineas)  # CRINEX PROG / DATE
+    except StopIteration:
+        raise ErrorHatanaka("Archivo vacío o sin cabecera CRINEX.") from None
+    if "CRINEX VERS" not in primera:
+        raise ErrorHatanaka("No es un archivo Compact RINEX.")
+    version_crx = 1 if primera[:20].strip().startswith("1") else 3
+
+    cabecera = []
+    for linea in lineas:
+        cabecera.append(linea)
+        yield linea
+        if linea[60:].strip() == "END OF HEADER":
+            break
+    else:
+        raise ErrorHatanaka("Cabecera RINEX sin END OF HEADER.")
+
+    tipos = _leer_tipos(cabecera, 2 if version_crx == 1 else 3)
+    yield from _Decodificador(version_crx, tipos).decodificar(lineas)
+
+
+def crx_a_rnx(ruta_crx: Path, ruta_rnx: Path, intervalo_s: Optional[int] = None) -> Path:
+    """
+    Convierte un archivo .crx/.YYd a RINEX escribiendo en flujo.
+    Con 'intervalo_s' (> 1) se escriben solo las épocas de esa malla (common.rinex.diezmar).
+    """
+    temporal = ruta_rnx.with_name(ruta_rnx.name + ".part")
+    try:
+        with open(ruta_crx, "r", encoding="ascii", errors="replace") as f_in, \
+                open(temporal, "w", encoding="ascii", newline="\n") as f_out:
+            lineas = decodificar_crx(f_in)
+            if intervalo_s and intervalo_s > 1:
+                lineas = diezmar(lineas, intervalo_s, ruta_crx.name)
+            for linea in lineas:
+                f_out.write(linea)
+                f_out.write("\n")
+        temporal.replace(ruta_rnx)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+    return ruta_rnx
@@ -1,8 +1,8 @@
+import numpy as np
 import pandas as pd
-from datetime import timezone, datetime
-import requests
-from io import StringIO
+from datetime import datetime
 from IGS.authenticator import SessionWithHeaderRedirection
+from common.http_cache import ErrorAutenticacion, cache_http, carpeta_cache
 from pathlib import Path
 def cargar_estaciones_tipo_S(ruta_csv="data/stations_s.csv"):
     ruta = Path(ruta_csv)
@@ -19,78 +19,135 @@ def cargar_estaciones_tipo_S(ruta_csv="data/stations_s.csv"):
         return set()
 def descargar_summary(anio):
     base_url = "https://cddis.nasa.gov/archive/gnss/data/highrate/reports/"
-    if anio == datetime.utcnow().year:
+    anio_actual = datetime.utcnow().year
+    if anio >= anio_actual:
         url = f"{base_url}hrv23_summary.current"
     else:
         url = f"{base_url}hrv23_summary.{anio}"
     #print(f"\n Descargando summary desde: {url}") 
     session = SessionWithHeaderRedirection()
-    r = session.get(url, stream=True, timeout=30)
-    if "html" in r.headers.get("Content-Type", ""):
+    try:
+        # Los años cerrados no cambian: se sirven desde la caché sin revalidar
+        ruta = cache_http().obtener(url, session, inmutable=anio < anio_actual)
+    except ErrorAutenticacion:
         print(" Error: contenido HTML recibido. Posible error de autenticación.")
         raise Exception("Error de autenticación: no se pudo descargar el summary.")
-    r.raise_for_status()
-    texto = r.text
+    texto = ruta.read_text()
     #print("🧾 Primeras líneas del summary:")
     #print('\n'.join(texto.splitlines()[:10]))
     return texto
-def parsear_summary(contenido_txt):
-    from io import StringIO
+# Columnas de cada línea del summary (mismas posiciones que el formato de CDDIS)
+_COLUMNAS_SUMMARY = {"Site": (2, 6), "Version": (8, 11), "Start": (50, 61), "End": (70, 81)}
+_LINEAS_CABECERA_SUMMARY = 5
+
+def _parsear_lineas_summary(lineas: pd.Series) -> pd.DataFrame:
+    """Parseo vectorizado (sin iterrows) de líneas del summary; descarta las que no tienen fechas válidas."""
+    campos = {nombre: lineas.str.slice(a, b).str.strip() for nombre, (a, b) in _COLUMNAS_SUMMARY.items()}
+    tabla = pd.DataFrame({
+        "Site": campos["Site"].str.upper(),
+        "Format": campos["Version"],
+        "Start": pd.to_datetime(campos["Start"], errors="coerce", format="%d-%b-%y", utc=True),
+        "End": pd.to_datetime(campos["End"], errors="coerce", format="%d-%b-%y", utc=True),
+        "_linea": pd.util.hash_array(lineas.to_numpy(dtype=object)),
+    })
+    return tabla[tabla["Start"].notna() & tabla["End"].notna()]
+
+def parsear_summary(contenido_txt, previo: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Tabla columnar del summary: Site (categórico), Format, Start/End (datetime64 UTC).
+    Con 'previo' (una tabla ya parseada) solo se parsean las líneas que cambiaron.
+    El resultado conserva la columna '_linea' (hash de la línea) para la siguiente actualización.
+    """
+    lineas = pd.Series(contenido_txt.splitlines()[_LINEAS_CABECERA_SUMMARY:], dtype=object)
+    hashes = pd.util.hash_array(lineas.to_numpy(dtype=object))
+
+    if previo is None or previo.empty:
+        tabla = _parsear_lineas_summary(lineas)
+    else:
+        conocidas = previo.drop_duplicates("_linea").set_index("_linea")
+        nuevas = ~np.isin(hashes, conocidas.index.to_numpy())
+        reutilizadas = conocidas.loc[conocidas.index.intersection(hashes)].reset_index()
+        tabla = pd.concat([reutilizadas, _parsear_lineas_summary(lineas[nuevas])], ignore_index=True)
+        # Reordenar según el archivo nuevo
+        posicion = pd.Series(np.arange(len(hashes)), index=hashes)
+        posicion = posicion[~posicion.index.duplicated(keep="last")]
+        tabla = tabla.iloc[np.argsort(posicion.loc[tabla["_linea"]].to_numpy(), kind="stable")]
 
-    df = pd.read_fwf(
-        StringIO(contenido_txt),
-        skiprows=5,
-        colspecs=[
-            (2, 6),    # Site
-            (8, 11),   # Version
-            (11, 29),  # Description
-            (31, 38),  # Latitud
-            (40, 48),  # Longittud
-            (50, 61),  # Start
-            (63, 68),  # StartDOY
-            (70, 81),  # End
-            (83, 88),  # EndDOY
-        ],
-        names=["Site", "Version", "Description", "Lat", "Lon", "Start", "StartDOY", "End", "EndDOY"]
-    )
+    # Una fila por estación (la última del archivo prevalece)
+    tabla = tabla[["Site", "Format", "Start", "End", "_linea"]].drop_duplicates("Site", keep="last")
+    tabla = tabla.astype({"Site": "category", "Format": "category"}).reset_index(drop=True)
+    return tabla.set_index("Site", drop=False).rename_axis(None)
 
-    df["Site"] = df["Site"].str.strip().str.upper()
-    df["Version"] = df["Version"].astype(str).str.strip()
-    df["Start"] = pd.to_datetime(df["Start"], errors="coerce", format="%d-%b-%y").dt.tz_localize(timezone.utc)
-    df["End"] = pd.to_datetime(df["End"], errors="coerce", format="%d-%b-%y").dt.tz_localize(timezone.utc)
+def ruta_summary_parseado(anio, en_curso=False) -> Path:
+    """Parquet del summary; el nombre indica la fuente ('.current' o el archivo anual cerrado)."""
+    return carpeta_cache("summary") / f"hrv23_{anio}{'.current' if en_curso else ''}.parquet"
+
+def _leer_summary_parseado(ruta) -> pd.DataFrame | None:
+    if not ruta.exists():
+        return None
+    try:
+        return pd.read_parquet(ruta)
+    except Exception as e:
+        print(f"Summary parseado ilegible ({ruta.name}): {e}")
+        return None
 
-    summary_dict = {
-        row["Site"]: {
-            "Start": row["Start"],
-            "End": row["End"],
-            "Format": row["Version"]
-        }
-        for _, row in df.iterrows()
-        if pd.notna(row["Start"]) and pd.notna(row["End"])
-    }
-    return summary_dict
+def cargar_summary(anio) -> pd.DataFrame:
+    """
+    Summary del año como tabla, persistida en Parquet. Los años cerrados se leen
+    directamente del disco si se parsearon del archivo anual; el año en curso (o uno
+    recién cerrado que se había parseado de '.current') se revalida y se actualiza
+    incrementalmente.
+    """
+    en_curso = anio >= datetime.utcnow().year
+    ruta = ruta_summary_parseado(anio, en_curso)
+    previo = _leer_summary_parseado(ruta)
+    if previo is not None and not en_curso:
+        return previo
+    # Año recién cerrado: se parte de lo parseado de '.current' y se completa con el archivo anual
+    ruta_current = ruta_summary_parseado(anio, True)
+    if previo is None and not en_curso:
+        previo = _leer_summary_parseado(ruta_current)
 
-def verificar_disponibilidad_summary(sitename, fecha, summary_dict, csv_df):
-    csv_df.columns = csv_df.columns.str.strip()
+    tabla = parsear_summary(descargar_summary(anio), previo)
+    if en_curso and previo is not None and np.array_equal(np.sort(tabla["_linea"].to_numpy()),
+                                                          np.sort(previo["_linea"].to_numpy())):
+        return tabla
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    try:
+        tabla.to_parquet(temporal)
+        temporal.replace(ruta)
+        if not en_curso:
+            ruta_current.unlink(missing_ok=True)
+    except Exception as e:
+        # Sin pyarrow o sin disco la búsqueda sigue con la tabla recién parseada
+        print(f"No se pudo guardar el summary parseado ({ruta.name}): {e}")
+        temporal.unlink(missing_ok=True)
+    return tabla
+
+def info_summary(sitename, summary):
+    """Fila del summary para la estación (Start, End, Format) o None."""
     nombre_corto = sitename[:4].upper()
-    fila_csv = csv_df[csv_df["estacion"].str.startswith(nombre_corto)]
-    
-    if fila_csv.empty:
+    if nombre_corto not in summary.index:
+        return None
+    return summary.loc[nombre_corto]
+
+def verificar_disponibilidad_summary(sitename, fecha, summary, registro):
+    nombre_corto = sitename[:4].upper()
+    if nombre_corto not in registro:
         print("Not found in local CSV.")
         return False, "The station is not listed in the local CSV file."
     
-    tiene_rate1s = fila_csv["rate 1s"].values[0].strip().upper() == "SI"
+    tiene_rate1s = bool(registro.valor(nombre_corto, "rate 1s", False))
     print(f"Has 1s rate data: {tiene_rate1s}")
     
     if not tiene_rate1s:
         return False, "The station has no 1s data (according to the local CSV)."
     
-    if nombre_corto not in summary_dict:
-        print("Not found in summary_dict.")
+    info = info_summary(nombre_corto, summary)
+    if info is None:
+        print("Not found in summary.")
         return False, "The station is not listed in the database for the selected year."
     
-    info = summary_dict[nombre_corto]
-    
     if pd.isna(info["Start"]) or pd.isna(info["End"]):
         return False, "Invalid date range."
     
@@ -101,11 +158,10 @@ def verificar_disponibilidad_summary(sitename, fecha, summary_dict, csv_df):
 
 
 
-def obtener_formato_rinex(sitename, summary_dict):
-    nombre_corto = sitename[:4].upper()
-    info = summary_dict.get(nombre_corto)
-    if not info:
-        return None 
+def obtener_formato_rinex(sitename, summary):
+    info = info_summary(sitename, summary)
+    if info is None:
+        return None
     version = str(info["Format"]).strip()
     if version.startswith("2"):
         return "2"
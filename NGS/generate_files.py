@@ -1,22 +1,21 @@
+import re
+import threading
 import pandas as pd
-import requests
-from geopy.distance import geodesic
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from common.http_cache import cache_http
+from common.spatial_index import estaciones_cercanas
+from common.stations import registro_noaa
 
 def cargar_estaciones_local(ruta_csv="data/noaa_cors.csv"):
-    df = pd.read_csv(ruta_csv, sep=",")
-    df.columns = df.columns.str.lower().str.strip()
-    df.rename(columns={
-        "siteid": "Station",
-        "y": "Latitude",
-        "x": "Longitude"
-    }, inplace=True)
+    # Catálogo compartido y de solo lectura: las funciones de abajo trabajan sobre copias
+    return registro_noaa(ruta_csv).df
 
-    return df
-
-def estaciones_mas_cercanas(df, lat_usuario, lon_usuario, n=2):
-    punto_usuario = (lat_usuario, lon_usuario)
-    df['Distance_km'] = df.apply(lambda row: geodesic(punto_usuario, (row['Latitude'], row['Longitude'])).kilometers, axis=1)
-    return df.sort_values('Distance_km').head(n).copy()
+def estaciones_mas_cercanas(df, lat_usuario, lon_usuario, n=2, radio_km=None):
+    df_cercanas, distancias = estaciones_cercanas(df, lat_usuario, lon_usuario, 'Latitude', 'Longitude', n, radio_km)
+    df_cercanas['Distance_km'] = distancias
+    return df_cercanas
 
 def generar_nombre_archivo(siteid, anio, doy, tipo='obs'):
     siteid = siteid.lower()
@@ -29,33 +28,112 @@ def generar_nombre_archivo(siteid, anio, doy, tipo='obs'):
     else:
         raise ValueError("Tipo inválido: usa 'obs' o 'crx'.")
 
-def verificar_disponibilidad_rinex(df_cercanas, anio, doy, tipo='obs'):
+# Días con más antigüedad ya no reciben archivos nuevos en NOAA
+DIAS_PARA_CERRAR = 30
+WORKERS_LISTAS = 4
+URL_BASE_NOAA = "https://noaa-cors-pds.s3.amazonaws.com/rinex"
+
+# ssssddd0.yyo.gz / ssssddd0.yyd.gz (el resto de la lista se ignora)
+_PATRON_ARCHIVO = re.compile(r"^([a-z0-9]{4})(\d{3})0\.(\d{2})([od])\.gz$")
+_TIPOS_SUFIJO = {"o": "obs", "d": "crx"}
+
+# Índices parseados por día, del más al menos reciente; los desalojados se reparsean
+# desde la caché HTTP (cada índice ocupa unos cientos de KB)
+MAX_INDICES_DIA = 64
+_INDICES_DIA = OrderedDict()
+_LOCK_INDICES = threading.Lock()
+
+
+def _dia_a_fecha(anio, doy):
+    return date(int(anio), 1, 1) + timedelta(days=int(doy) - 1)
+
+
+def parsear_lista_archivos(contenido, anio, doy):
+    """
+    Índice de un YYYY.DDD.files.list: {tipo: frozenset(estaciones)}.
+    Solo cuenta los archivos diarios que corresponden a ese día.
+    """
+    yy, doy_str = str(anio)[-2:], str(doy).zfill(3)
+    indice = {tipo: set() for tipo in _TIPOS_SUFIJO.values()}
+    for token in contenido.split():
+        coincidencia = _PATRON_ARCHIVO.match(token.rsplit("/", 1)[-1].lower())
+        if coincidencia and coincidencia.group(2) == doy_str and coincidencia.group(3) == yy:
+            indice[_TIPOS_SUFIJO[coincidencia.group(4)]].add(coincidencia.group(1))
+    return {tipo: frozenset(estaciones) for tipo, estaciones in indice.items()}
+
+
+def indice_dia(anio, doy):
+    """
+    Índice de archivos disponibles en NOAA para un día, parseado una sola vez por
+    proceso (se conservan los MAX_INDICES_DIA más recientes). La lista se revalida en la caché HTTP y solo se reparsea si cambió.
+    """
+    doy_str = str(doy).zfill(3)
+    url_lista = f"{URL_BASE_NOAA}/{anio}/{doy_str}/{anio}.{doy_str}.files.list"
+    cerrado = (date.today() - _dia_a_fecha(anio, doy)).days > DIAS_PARA_CERRAR
+    clave = (int(anio), int(doy))
+    with _LOCK_INDICES:
+        guardado = _INDICES_DIA.get(clave)
+        if guardado:
+            _INDICES_DIA.move_to_end(clave)
+    if guardado and guardado[0] is None:
+        return guardado[1]
+
+    ruta = cache_http().obtener(url_lista, inmutable=cerrado)
+    estado = ruta.stat()
+    # os.replace en cada descarga nueva cambia el inodo (un 304 solo toca el mtime)
+    version = None if cerrado else (estado.st_ino, estado.st_size)
+    if guardado and version is not None and guardado[0] == version:
+        return guardado[1]
+    indice = parsear_lista_archivos(ruta.read_text(errors="replace"), anio, doy)
+    with _LOCK_INDICES:
+        _INDICES_DIA[clave] = (version, indice)
+        _INDICES_DIA.move_to_end(clave)
+        while len(_INDICES_DIA) > MAX_INDICES_DIA:
+            _INDICES_DIA.popitem(last=False)
+    return indice
+
+
+def url_rinex(station, anio, doy, tipo='obs'):
     doy_str = str(doy).zfill(3)
-    url_lista = f"https://noaa-cors-pds.s3.amazonaws.com/rinex/{anio}/{doy_str}/{anio}.{doy_str}.files.list"
-    try:
-        r = requests.get(url_lista)
-        r.raise_for_status()
-        contenido = r.text
-    except Exception as e:
-        print(f"Error al obtener lista de archivos: {e}")
+    nombre_archivo = generar_nombre_archivo(station, anio, doy, tipo)
+    return f"{URL_BASE_NOAA}/{anio}/{doy_str}/{station.lower()}/{nombre_archivo}"
+
+
+def matriz_disponibilidad(estaciones, dias, tipo='obs', workers=WORKERS_LISTAS):
+    """
+    Disponibilidad estación × día en una sola pasada.
+    'dias' acepta fechas o tuplas (anio, doy). Devuelve un DataFrame booleano
+    (filas = estaciones, columnas = fechas) con <NA> en los días cuya lista no
+    se pudo obtener.
+    """
+    if tipo not in _TIPOS_SUFIJO.values():
+        raise ValueError("Tipo inválido: usa 'obs' o 'crx'.")
+    fechas = [d if isinstance(d, date) else _dia_a_fecha(*d) for d in dias]
+    codigos = pd.Index([str(e).lower() for e in estaciones])
+
+    def _columna(fecha):
+        try:
+            indice = indice_dia(fecha.year, fecha.timetuple().tm_yday)
+        except Exception as e:
+            print(f"Error al obtener lista de archivos ({fecha}): {e}")
+            return pd.array([pd.NA] * len(codigos), dtype="boolean")
+        return pd.array(codigos.isin(indice[tipo]), dtype="boolean")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(fechas) or 1))) as executor:
+        columnas = list(executor.map(_columna, fechas))
+    return pd.DataFrame(dict(zip(fechas, columnas)), index=pd.Index(list(estaciones), name="Station"),
+                        columns=fechas)
+
+
+def verificar_disponibilidad_rinex(df_cercanas, anio, doy, tipo='obs'):
+    matriz = matriz_disponibilidad(df_cercanas['Station'], [(anio, doy)], tipo)
+    disponible = matriz.iloc[:, 0]
+    if disponible.isna().all() and len(disponible):
         df_cercanas['Available'] = "ERROR"
         df_cercanas['URL'] = None
         return df_cercanas
 
-    disponibles = []
-    urls = []
-
-    for _, row in df_cercanas.iterrows():
-        station = row['Station'] ## pending review
-        nombre_archivo = generar_nombre_archivo(station, anio, doy, tipo)
-        if nombre_archivo in contenido:
-            disponibles.append("YES")
-            url = f"https://noaa-cors-pds.s3.amazonaws.com/rinex/{anio}/{doy_str}/{station.lower()}/{nombre_archivo}"
-            urls.append(url)
-        else:
-            disponibles.append("NO")
-            urls.append(None)
-
-    df_cercanas['Available'] = disponibles
-    df_cercanas['URL'] = urls
-    return df_cercanas
\ No newline at end of file
+    df_cercanas['Available'] = ["YES" if d else "NO" for d in disponible]
+    df_cercanas['URL'] = [url_rinex(station, anio, doy, tipo) if d else None
+                          for station, d in zip(df_cercanas['Station'], disponible)]
+    return df_cercanas
@@ -0,0 +1,251 @@
+"""
+Descargas por lotes sin Streamlit (trabajos nocturnos).
+
+Recorre estaciones × días (u órbitas × días) con paralelismo acotado y guarda
+el estado de cada archivo en un manifiesto SQLite: al volver a ejecutar, lo ya
+descargado se salta y solo se reintentan los fallos.
+
+Ejemplos:
+  python batch.py igs --estaciones ABMF00GLP,ABPO00MDG --desde 2025-01-01 --hasta 2025-01-31
+  python batch.py ngs --archivo-estaciones estaciones.txt --desde 2025-01-01 --hasta 2025-01-07 --tipo crx
+  python batch.py orbitas --instituciones COD,IGS --producto FIN --desde 2025-01-01 --hasta 2025-01-07
+
+Entorno:
+  GNSS_CACHE_ROOT    raíz de la caché local (por defecto .cache; la caché HTTP en <raíz>/http)
+  GNSS_CACHE_MAX_MB  tope de la caché HTTP en MB (por defecto 2048)
+"""
+import argparse
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from common.manifest import ESTADO_ERROR, ESTADO_NO_DISPONIBLE, ESTADO_OK, Manifiesto
+
+WORKERS_DEFECTO = 2
+
+
+def _fecha(texto: str) -> date:
+    return datetime.strptime(texto, "%Y-%m-%d").date()
+
+
+def _rango_dias(desde: date, hasta: date) -> list[date]:
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+
+def _leer_estaciones(args) -> list[str]:
+    estaciones = []
+    if args.estaciones:
+        estaciones += [e.strip() for e in args.estaciones.split(",")]
+    if args.archivo_estaciones:
+        estaciones += [linea.split("#")[0].strip() for linea in Path(args.archivo_estaciones).read_text().splitlines()]
+    estaciones = list(dict.fromkeys(e for e in estaciones if e))
+    if not estaciones:
+        raise SystemExit("Indique al menos una estación (--estaciones o --archivo-estaciones).")
+    return estaciones
+
+
+def tareas_igs(args, dias):
+    from IGS.generate_files import download_file_zip
+    from common.stations import registro_igs
+    from IGS.sumary_checker import cargar_summary, obtener_formato_rinex
+    from IGS.availability import disponibilidad_rango
+
+    estaciones = _leer_estaciones(args)
+    summaries = {anio: cargar_summary(anio) for anio in sorted({d.year for d in dias})}
+    cubo = disponibilidad_rango(estaciones, dias[0], dias[-1], registro_igs(), list(summaries.values()))
+    carpeta = Path(args.salida) / "igs"
+
+    for estacion in estaciones:
+        for dia in dias:
+            clave = (f"igs:{estacion}:{dia}:{args.hora_inicio:02d}-{args.hora_fin:02d}"
+                     + (":empalmado" if args.empalmar else "") + (f":{args.intervalo}s" if args.intervalo > 1 else "")
+                     + (f":{args.formato}" if args.formato != "rnx.zip" else ""))
+            variante = clave.split(":", 3)[3].replace(":", "_")
+
+            def tarea(estacion=estacion, dia=dia, variante=variante):
+                if not cubo.at[estacion, dia]:
+                    return ESTADO_NO_DISPONIBLE, None, "Sin datos de 1 s según el summary."
+                rinex_version = obtener_formato_rinex(estacion, summaries[dia.year])
+                if rinex_version is None:
+                    return ESTADO_NO_DISPONIBLE, None, "Versión RINEX desconocida."
+                reporte_qc = []
+                ok, mensaje, zip_path, temp_dir = download_file_zip(
+                    datetime.combine(dia, datetime.min.time()), estacion, args.hora_inicio, args.hora_fin,
+                    rinex_version, nivel_compresion=args.nivel_compresion, reporte_qc=reporte_qc,
+                    empalmar=args.empalmar, presupuesto_disco_mb=args.presupuesto_disco_mb,
+                    presupuesto_memoria_mb=args.presupuesto_memoria_mb, intervalo_s=args.intervalo,
+                    formato=args.formato)
+                if not ok:
+                    return ESTADO_ERROR, None, mensaje
+                # El control de calidad queda en el manifiesto junto a la ruta (los formatos Hatanaka no lo tienen)
+                bloques = (args.hora_fin - args.hora_inicio) * 4
+                if reporte_qc:
+                    completitud = 100 * sum(qc["completitud"] for qc in reporte_qc) / bloques
+                    mensaje += f" QC: {len(reporte_qc)}/{bloques} bloques, {completitud:.1f} % de épocas."
+                # Una carpeta por variante (horas, empalme, muestreo, formato): como en la clave del manifiesto
+                destino = carpeta / estacion / variante / zip_path.name
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(zip_path, destino)
+                temp_dir.cleanup()
+                return ESTADO_OK, destino, mensaje
+
+            yield clave, tarea
+
+
+def tareas_ngs(args, dias):
+    import pandas as pd
+    from NGS.generate_files import generar_nombre_archivo, matriz_disponibilidad, url_rinex
+    from common.http_cache import descargar_directo
+
+    estaciones = _leer_estaciones(args)
+    matriz = matriz_disponibilidad(estaciones, dias, args.tipo)
+    carpeta = Path(args.salida) / "ngs"
+
+    for estacion in estaciones:
+        for dia in dias:
+            anio, doy = dia.year, dia.timetuple().tm_yday
+            clave = f"ngs:{estacion}:{dia}:{args.tipo}"
+
+            def tarea(estacion=estacion, dia=dia, anio=anio, doy=doy):
+                disponible = matriz.at[estacion, dia]
+                if pd.isna(disponible):
+                    return ESTADO_ERROR, None, "No se pudo obtener la lista de archivos del día."
+                if not disponible:
+                    return ESTADO_NO_DISPONIBLE, None, "No figura en files.list."
+                destino = carpeta / estacion.lower() / generar_nombre_archivo(estacion, anio, doy, args.tipo)
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                # Se consume una vez: directo al destino, sin ocupar la caché compartida
+                return ESTADO_OK, descargar_directo(url_rinex(estacion, anio, doy, args.tipo), destino), None
+
+            yield clave, tarea
+
+
+def tareas_orbitas(args, dias):
+    from efemerides.generate_date import obtener_anio_doy_semana
+    from efemerides.generate_files import construir_url_sp3, descargar_y_descomprimir_sp3
+    from efemerides.instituciones_diccionario import instituciones
+    from efemerides.summary_checker import md5_publicado
+    from efemerides.sp3 import cargar_sp3
+
+    codigos = [c.strip().upper() for c in args.instituciones.split(",")] if args.instituciones else list(instituciones)
+    desconocidas = [c for c in codigos if c not in instituciones]
+    if desconocidas:
+        raise SystemExit(f"Instituciones desconocidas: {', '.join(desconocidas)}")
+    carpeta = Path(args.salida) / "orbitas"
+
+    for dia in dias:
+        anio, doy, semana = obtener_anio_doy_semana(dia.strftime("%Y-%m-%d"))
+        for institucion in codigos:
+            for producto in instituciones[institucion]["productos"]:
+                if producto["producto"] != args.producto:
+                    continue
+                url, nombre = construir_url_sp3(semana, institucion, producto["tipo"], args.producto,
+                                                anio, doy, producto["sampling"])
+                clave = f"orbitas:{nombre}"
+
+                def tarea(url=url, nombre=nombre, semana=semana):
+                    md5 = md5_publicado(nombre, semana)
+                    if md5 is None:
+                        return ESTADO_NO_DISPONIBLE, None, "No figura en MD5SUMS."
+                    ruta = descargar_y_descomprimir_sp3(url, nombre, carpeta, md5=md5)
+                    if ruta is None:
+                        return ESTADO_ERROR, None, "Fallo en la descarga."
+                    if args.npy:
+                        cargar_sp3(ruta)
+                    return ESTADO_OK, ruta, None
+
+                yield clave, tarea
+
+
+def ejecutar(tareas, manifiesto: Manifiesto, workers=WORKERS_DEFECTO, reintentar_no_disponibles=False):
+    """Ejecuta las tareas pendientes con a lo sumo 'workers' en paralelo y las registra en el manifiesto."""
+    tareas = list(tareas)
+    pendientes = [(clave, tarea) for clave, tarea in tareas
+                  if manifiesto.pendiente(clave, reintentar_no_disponibles)]
+    print(f"{len(pendientes)} tareas pendientes.")
+
+    def correr(clave, tarea):
+        try:
+            estado, ruta, mensaje = tarea()
+        except Exception as e:
+            estado, ruta, mensaje = ESTADO_ERROR, None, f"{type(e).__name__}: {e}"
+        manifiesto.registrar(clave, estado, ruta, mensaje)
+        return clave, estado, mensaje
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futuros = [pool.submit(correr, clave, tarea) for clave, tarea in pendientes]
+        for futuro in as_completed(futuros):
+            clave, estado, mensaje = futuro.result()
+            print(f"[{estado}] {clave}" + (f" - {mensaje}" if mensaje and estado != ESTADO_OK else ""))
+    # Solo las tareas de esta ejecución: un error antiguo de otro rango no cuenta
+    return manifiesto.resumen(clave for clave, _ in tareas)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--desde", type=_fecha, required=True, help="Fecha inicial (YYYY-MM-DD)")
+    comunes.add_argument("--hasta", type=_fecha, help="Fecha final inclusive (por defecto = --desde)")
+    comunes.add_argument("--salida", default="descargas_lote", help="Carpeta de resultados")
+    comunes.add_argument("--manifiesto", help="Ruta del manifiesto SQLite (por defecto <salida>/manifiesto.sqlite)")
+    comunes.add_argument("--workers", type=int, default=WORKERS_DEFECTO, help="Tareas en paralelo")
+    comunes.add_argument("--reintentar-no-disponibles", action="store_true",
+                         help="Volver a consultar también lo marcado como no disponible")
+    estaciones = argparse.ArgumentParser(add_help=False)
+    estaciones.add_argument("--estaciones", help="Lista separada por comas")
+    estaciones.add_argument("--archivo-estaciones", help="Archivo con una estación por línea")
+
+    sub = parser.add_subparsers(dest="fuente", required=True)
+    igs = sub.add_parser("igs", parents=[comunes, estaciones], help="RINEX de 1 s de CDDIS (IGS)")
+    igs.add_argument("--hora-inicio", type=int, default=0)
+    igs.add_argument("--hora-fin", type=int, default=24)
+    igs.add_argument("--nivel-compresion", type=int, default=6, choices=range(10), metavar="0-9")
+    igs.add_argument("--intervalo", type=int, default=1, choices=[1, 5, 10, 15, 30, 60],
+                     help="Muestreo de salida en segundos (diezma los datos de 1 s al convertir)")
+    igs.add_argument("--empalmar", action="store_true",
+                     help="Unir los bloques de 15 min en un solo RINEX por estación y día")
+    igs.add_argument("--formato", default="rnx.zip",
+                     choices=["rnx.zip", "crx.zip", "crx.gz.zip", "rnx.tar.xz", "rnx.tar.zst"],
+                     help="Salida: RINEX en ZIP, bloques Hatanaka sin convertir o RINEX en tar con xz/zstd")
+    igs.add_argument("--presupuesto-disco-mb", type=float, default=512,
+                     help="Máximo de intermedios (CRX + RNX en curso) por estación y día")
+    igs.add_argument("--presupuesto-memoria-mb", type=float, default=512,
+                     help="Memoria nominal para los bloques en curso (48 MB estimados por bloque, no medidos)")
+    igs.set_defaults(generar=tareas_igs)
+
+    ngs = sub.add_parser("ngs", parents=[comunes, estaciones], help="RINEX diarios de NOAA CORS")
+    ngs.add_argument("--tipo", choices=["obs", "crx"], default="obs")
+    ngs.set_defaults(generar=tareas_ngs)
+
+    orbitas = sub.add_parser("orbitas", parents=[comunes], help="Órbitas precisas SP3 de CDDIS")
+    orbitas.add_argument("--instituciones", help="Códigos separados por comas (por defecto todas)")
+    orbitas.add_argument("--producto", choices=["FIN", "RAP"], default="FIN")
+    orbitas.add_argument("--npy", action="store_true",
+                         help="Dejar junto a cada SP3 su caché .npy (arrays para interpolar sin reparsear)")
+    orbitas.set_defaults(generar=tareas_orbitas)
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    args.hasta = args.hasta or args.desde
+    if args.hasta < args.desde:
+        raise SystemExit("--hasta debe ser posterior a --desde.")
+    if args.fuente == "igs" and not 0 <= args.hora_inicio < args.hora_fin <= 24:
+        raise SystemExit("Rango horario inválido.")
+    if args.fuente == "igs" and args.formato.startswith("crx") and (args.empalmar or args.intervalo > 1):
+        raise SystemExit("--empalmar e --intervalo requieren un formato RINEX (rnx.*).")
+
+    manifiesto = Manifiesto(args.manifiesto or Path(args.salida) / "manifiesto.sqlite")
+    try:
+        resumen = ejecutar(args.generar(args, _rango_dias(args.desde, args.hasta)), manifiesto,
+                           args.workers, args.reintentar_no_disponibles)
+    finally:
+        manifiesto.cerrar()
+    print("Resumen: " + ", ".join(f"{estado}={n}" for estado, n in sorted(resumen.items())))
+    return 1 if resumen.get(ESTADO_ERROR) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Benchmark de los formatos de salida de IGS.generate_files (FORMATOS_SALIDA).
+
+Para cada formato mide, sobre los mismos bloques CRX:
+- tamaño del archivo a transferir (y su proporción frente al RINEX sin comprimir);
+- codificación: desde el bloque descargado hasta el contenedor final (el .crx.gz
+  del servidor en 'crx.gz.zip', el CRX descomprimido en los demás; incluye la
+  conversión Hatanaka en los formatos RINEX);
+- decodificación: desde el contenedor hasta RINEX plano en disco, que es lo que
+  necesita quien lo descarga (incluye la conversión en los formatos Hatanaka).
+
+Los bloques son sintéticos (bench_hatanaka.crx_sintetico, uno distinto por bloque) o
+los archivos .crx reales pasados como argumentos. zstd solo se mide si 'zstandard' está
+instalado. Todo corre en un solo hilo: en el servidor los bloques se reparten entre núcleos.
+
+Uso: python -m benchmarks.bench_formatos [--bloques 4] [--epocas 900] [--satelites 40] [--nivel 6] [archivo.crx ...]
+"""
+import argparse
+import gzip
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from benchmarks.bench_hatanaka import crx_sintetico
+from IGS.generate_files import FORMATOS_SALIDA
+from IGS.hatanaka import crx_a_rnx
+from common.archive import EXTENSIONES, NIVEL_COMPRESION_DEFECTO, abrir_contenedor
+
+
+def _bloques_crx(carpeta, args):
+    """CRX de prueba y, junto a cada uno, su '.crx.gz' como lo publica el servidor."""
+    carpeta.mkdir()
+    rutas = []
+    if args.archivos:
+        for ruta in args.archivos:
+            rutas.append(carpeta / ruta.name)
+            shutil.copyfile(ruta, rutas[-1])
+    else:
+        for i in range(args.bloques):
+            ruta = carpeta / f"BENC00XXX_S_2024001{i // 4:02d}{i % 4 * 15:02d}_15M_01S_MO.crx"
+            ruta.write_text("\n".join(crx_sintetico(args.epocas, args.satelites, semilla=i)) + "\n",
+                            encoding="ascii")
+            rutas.append(ruta)
+    for ruta in rutas:
+        with open(ruta, "rb") as f_in, gzip.GzipFile(ruta.with_name(ruta.name + ".gz"), "wb",
+                                                     compresslevel=NIVEL_COMPRESION_DEFECTO) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    return rutas
+
+
+def _codificar(contenido, compresion, nivel, rutas_crx, trabajo, destino):
+    with abrir_contenedor(destino, compresion, 0 if contenido == "crx.gz" else nivel) as contenedor:
+        for ruta_crx in rutas_crx:
+            if contenido == "crx.gz":
+                ruta_crx = ruta_crx.with_name(ruta_crx.name + ".gz")
+            copia = trabajo / ruta_crx.name
+            shutil.copyfile(ruta_crx, copia)
+            if contenido != "rnx":
+                contenedor.agregar(copia)
+            else:
+                contenedor.agregar(crx_a_rnx(copia, copia.with_suffix(".rnx")))
+                copia.unlink()
+
+
+def _abrir_tar(ruta, compresion):
+    if compresion == "xz":
+        return tarfile.open(ruta, "r:xz")
+    import zstandard
+    return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(open(ruta, "rb")), mode="r|")
+
+
+def _decodificar(contenido, compresion, ruta, salida):
+    """Extrae el contenedor y deja RINEX plano en 'salida'; devuelve sus bytes."""
+    if compresion == "zip":
+        with zipfile.ZipFile(ruta) as z:
+            z.extractall(salida)
+    else:
+        with _abrir_tar(ruta, compresion) as tar:
+            tar.extractall(salida)
+    total = 0
+    for archivo in sorted(salida.iterdir()):
+        if contenido == "crx.gz":
+            crx = archivo.with_suffix("")
+            with gzip.open(archivo, "rb") as f_in, open(crx, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            archivo.unlink()
+            archivo = crx
+        if contenido != "rnx":
+            rnx = crx_a_rnx(archivo, archivo.with_suffix(".rnx"))
+            archivo.unlink()
+            archivo = rnx
+        total += archivo.stat().st_size
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bloques", type=int, default=4)
+    parser.add_argument("--epocas", type=int, default=900)
+    parser.add_argument("--satelites", type=int, default=40)
+    parser.add_argument("--nivel", type=int, default=6, choices=range(10), metavar="0-9")
+    parser.add_argument("archivos", nargs="*", type=Path)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temporal:
+        temporal = Path(temporal)
+        rutas_crx = _bloques_crx(temporal / "crx", args)
+        bytes_crx = sum(ruta.stat().st_size for ruta in rutas_crx)
+        bytes_rnx = None
+        print(f"{len(rutas_crx)} bloques, {bytes_crx / 1e6:.2f} MB CRX, nivel {args.nivel}\n")
+        print(f"{'formato':<13} {'tamaño MB':>10} {'% RINEX':>8} {'codificar s':>12} {'decodificar s':>14}")
+        for formato, (contenido, compresion) in FORMATOS_SALIDA.items():
+            trabajo = temporal / formato
+            trabajo.mkdir()
+            destino = trabajo / f"salida{EXTENSIONES[compresion]}"
+            try:
+                inicio = time.perf_counter()
+                _codificar(contenido, compresion, args.nivel, rutas_crx, trabajo, destino)
+                codificar = time.perf_counter() - inicio
+            except RuntimeError as e:
+                print(f"{formato:<13} omitido: {e}")
+                continue
+            salida = trabajo / "rnx"
+            salida.mkdir()
+            inicio = time.perf_counter()
+            bytes_decodificados = _decodificar(contenido, compresion, destino, salida)
+            decodificar = time.perf_counter() - inicio
+            bytes_rnx = bytes_rnx or bytes_decodificados
+            if bytes_decodificados != bytes_rnx:
+                raise SystemExit(f"{formato}: el RINEX recuperado no coincide ({bytes_decodificados} bytes).")
+            tamano = destino.stat().st_size
+            print(f"{formato:<13} {tamano / 1e6:>10.2f} {100 * tamano / bytes_rnx:>7.1f}% "
+                  f"{codificar:>12.3f} {decodificar:>14.3f}")
+            shutil.rmtree(trabajo)
+        print(f"\nRINEX sin comprimir: {bytes_rnx / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
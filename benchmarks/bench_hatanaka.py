@@ -0,0 +1,139 @@
+"""
+Benchmark del decodificador Hatanaka en proceso (IGS.hatanaka).
+
+1. Verifica el ejemplo del formato Compact RINEX 3.0 contra su RINEX esperado.
+2. Mide el rendimiento sobre un CRX sintético equivalente a un bloque de 15 min a 1 s.
+3. Opcionalmente mide archivos .crx reales pasados como argumentos.
+
+Uso: python -m benchmarks.bench_hatanaka [--epocas 900] [--satelites 40] [archivo.crx ...]
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+from IGS.hatanaka import decodificar_crx
+
+EJEMPLO_CRX = """\
+3.0                 COMPACT RINEX FORMAT                    CRINEX VERS   / TYPE
+RNX2CRX ver.4.0.8                       08-Apr-21 06:56     CRINEX PROG / DATE
+     3.01           OBSERVATION DATA    M (MIXED)           RINEX VERSION / TYPE
+G    7 L1C L2P C1P C2P C1C S1P S2P                          SYS / # / OBS TYPES
+R    3 L1C C1C S1C                                          SYS / # / OBS TYPES
+S    3 L1C C1C S1C                                          SYS / # / OBS TYPES
+  2010     3     5     0     0     0.0000000     GPS        TIME OF FIRST OBS
+                                                            END OF HEADER
+> 2010 03 05 00 00 30.0000000  0 8       G13R19G32G 7R23G31G20R11
+
+3&130321269801 3&101549030349 3&24799319672 3&24799319752 3&24799318768 3&62000 3&80000 0808&9&9&7&&&&
+3&129262004577 3&24597748629 3&47000 08&7&&
+3&133135049387 3&103741584182 3&25334766349 3&25334768879 3&25334766309 3&75000 3&83000 0808&9&9&7&&&&
+3&133174968818 3&103772690977 3&25342359815 3&25342359952 3&25342359370 3&65000 3&45000 0808&9&9&7&&&&
+3&119323293479 3&22706470024 3&79000 08&7&&
+3&114311363565 3&92979182851 3&21752728352 3&21752728204 3&21752729338 3&72000 3&63000 0808&9&9&7&&&&
+3&135891004299 3&105889081832 3&25859215981 3&25859207736 3&25859205875 3&44000 3&46000 0808&9&9&7&&&&
+3&131986783861 3&25116253066 3&38000 08&7&&
+"""
+
+EJEMPLO_RNX = """\
+     3.01           OBSERVATION DATA    M (MIXED)           RINEX VERSION / TYPE
+G    7 L1C L2P C1P C2P C1C S1P S2P                          SYS / # / OBS TYPES
+R    3 L1C C1C S1C                                          SYS / # / OBS TYPES
+S    3 L1C C1C S1C                                          SYS / # / OBS TYPES
+  2010     3     5     0     0     0.0000000     GPS        TIME OF FIRST OBS
+                                                            END OF HEADER
+> 2010 03 05 00 00 30.0000000  0 8
+G13 130321269.80108 101549030.34908  24799319.672 9  24799319.752 9  24799318.768 7        62.000          80.000
+R19 129262004.57708  24597748.629 7        47.000
+G32 133135049.38708 103741584.18208  25334766.349 9  25334768.879 9  25334766.309 7        75.000          83.000
+G 7 133174968.81808 103772690.97708  25342359.815 9  25342359.952 9  25342359.370 7        65.000          45.000
+R23 119323293.47908  22706470.024 7        79.000
+G31 114311363.56508  92979182.85108  21752728.352 9  21752728.204 9  21752729.338 7        72.000          63.000
+G20 135891004.29908 105889081.83208  25859215.981 9  25859207.736 9  25859205.875 7        44.000          46.000
+R11 131986783.86108  25116253.066 7        38.000
+"""
+
+
+def _cabecera_sintetica(n_tipos):
+    tipos = " ".join(f"C{i % 9 + 1}X" for i in range(n_tipos))
+    return [
+        "3.0                 COMPACT RINEX FORMAT                    CRINEX VERS   / TYPE",
+        "bench_hatanaka                                              CRINEX PROG / DATE",
+        "     3.04           OBSERVATION DATA    G                   RINEX VERSION / TYPE",
+        f"G{n_tipos:5d} {tipos}".ljust(60) + "SYS / # / OBS TYPES",
+        "".ljust(60) + "END OF HEADER",
+    ]
+
+
+def _diferencia_texto(anterior, nuevo):
+    """Codifica 'nuevo' respecto a 'anterior' como lo hace RNX2CRX."""
+    anterior = anterior.ljust(len(nuevo))
+    return "".join(" " if a == b else ("&" if b == " " else b) for a, b in zip(anterior, nuevo)).rstrip()
+
+
+def crx_sintetico(n_epocas, n_satelites, n_tipos=8, orden=3, semilla=0):
+    """Genera líneas CRX 3.0 codificando diferencias de orden 'orden' de arcos suaves."""
+    aleatorio = random.Random(semilla)
+    satelites = [f"G{i + 1:02d}" for i in range(n_satelites)]
+    inicio = {s: [aleatorio.randint(20_000_000_000, 130_000_000_000) for _ in range(n_tipos)] for s in satelites}
+    deriva = {s: [aleatorio.randint(-800_000, 800_000) for _ in range(n_tipos)] for s in satelites}
+    historia = {}
+    lineas = _cabecera_sintetica(n_tipos)
+    anterior = None
+    for epoca in range(n_epocas):
+        linea = f"> 2024 01 01 {epoca // 3600:02d} {epoca // 60 % 60:02d}{epoca % 60:11.7f}  0{n_satelites:3d}"
+        linea = linea.ljust(41) + "".join(satelites)
+        lineas.append(linea if anterior is None else _diferencia_texto(anterior, linea))
+        anterior = linea
+        lineas.append("")
+        for s in satelites:
+            campos = []
+            for i in range(n_tipos):
+                valor = inicio[s][i] + deriva[s][i] * epoca + aleatorio.randint(-500, 500)
+                arco = historia.get((s, i))
+                if arco is None:
+                    historia[(s, i)] = [valor]
+                    campos.append(f"{orden}&{valor}")
+                    continue
+                m = min(len(arco), orden)
+                nuevo = [valor]
+                for k in range(1, m + 1):
+                    nuevo.append(nuevo[k - 1] - arco[k - 1])
+                historia[(s, i)] = nuevo
+                campos.append(str(nuevo[m]))
+            lineas.append(" ".join(campos))
+    return lineas
+
+
+def _medir(nombre, lineas_crx):
+    entrada = sum(len(linea) + 1 for linea in lineas_crx)
+    inicio = time.perf_counter()
+    salida = 0
+    epocas = 0
+    for linea in decodificar_crx(iter(lineas_crx)):
+        salida += len(linea) + 1
+        epocas += linea.startswith(">")
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<28} {epocas:>6} épocas  {entrada / 1e6:7.2f} MB CRX -> {salida / 1e6:7.2f} MB RNX  "
+          f"{segundos:6.3f} s  {salida / 1e6 / segundos:6.1f} MB/s  {epocas / segundos:8.0f} épocas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--epocas", type=int, default=900)
+    parser.add_argument("--satelites", type=int, default=40)
+    parser.add_argument("--tipos", type=int, default=8)
+    parser.add_argument("archivos", nargs="*", type=Path)
+    args = parser.parse_args()
+
+    decodificado = "\n".join(decodificar_crx(iter(EJEMPLO_CRX.splitlines()))) + "\n"
+    if decodificado != EJEMPLO_RNX:
+        raise SystemExit("El ejemplo del formato no coincide con el RINEX esperado.")
+    print("Ejemplo del formato CRX 3.0: OK")
+
+    _medir("sintético 15M_01S", crx_sintetico(args.epocas, args.satelites, args.tipos))
+    for ruta in args.archivos:
+        _medir(ruta.name, ruta.read_text(encoding="ascii", errors="replace").splitlines())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Tiempo de importación de cada herramienta (arranque en frío del contenedor).
+
+Para cada módulo lanza un intérprete nuevo con '-X importtime', suma el tiempo
+acumulado de las importaciones de primer nivel y comprueba:
+  - que no supere su presupuesto (ms),
+  - que no arrastre módulos pesados ajenos a la herramienta (folium, scipy...),
+  - que no abra archivos de datos (.csv, .env) durante la importación.
+Termina con código 1 si alguna comprobación falla.
+
+Uso: python -m benchmarks.bench_importtime [--repeticiones 3] [--factor 1.0] [modulo ...]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+_MARCA = "-- inicio importacion --"
+
+# modulo: (presupuesto en ms, módulos que no debe cargar); ~2x lo medido en un contenedor de 1 CPU
+OBJETIVOS = {
+    "IGS.generate_files": (600, ("folium", "streamlit_folium", "geopy", "scipy", "dotenv")),
+    "IGS.app": (900, ("folium", "streamlit_folium", "geopy", "scipy", "dotenv")),
+    "NGS.app": (300, ("folium", "streamlit_folium", "geopy", "scipy", "pandas")),
+    "NGS.generate_files": (900, ("folium", "streamlit_folium", "geopy", "scipy")),
+    "efemerides.generate_files": (200, ("pandas", "streamlit", "folium", "dotenv")),
+    "efemerides.app": (500, ("pandas", "folium", "streamlit_folium", "scipy", "dotenv")),
+    "batch": (100, ("pandas", "streamlit", "folium", "requests")),
+}
+
+_HIJO = """
+import sys, json
+abiertos = []
+def _auditar(evento, argumentos):
+    if evento == "open" and isinstance(argumentos[0], str):
+        abiertos.append(argumentos[0])
+sys.addaudithook(_auditar)
+sys.stderr.write({marca!r} + "\\n")
+sys.stderr.flush()
+__import__({modulo!r})
+print(json.dumps({{"modulos": sorted(sys.modules), "abiertos": abiertos}}))
+"""
+
+
+def medir(modulo: str) -> dict:
+    codigo = _HIJO.format(marca=_MARCA, modulo=modulo)
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ,
+                             capture_output=True, text=True)
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+    lineas = proceso.stderr.split(_MARCA, 1)[1].splitlines()
+    total_us = 0
+    for linea in lineas:
+        if not linea.startswith("import time:"):
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        # Solo las de primer nivel: las anidadas ya están en su acumulado
+        if acumulado.strip().isdigit() and not nombre.startswith("  "):
+            total_us += int(acumulado)
+    datos = json.loads(proceso.stdout.strip().splitlines()[-1])
+    datos["ms"] = total_us / 1000
+    return datos
+
+
+def _archivos_de_datos(abiertos):
+    propios = []
+    for ruta in abiertos:
+        ruta = Path(ruta)
+        if ruta.suffix in (".py", ".pyc", ".so", ".pth", ".json", ".typed") or ruta.is_dir():
+            continue
+        if ruta.suffix in (".csv", ".env", ".parquet", ".txt") or ruta.name == ".env":
+            propios.append(str(ruta))
+    return propios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se toma el mejor tiempo")
+    parser.add_argument("--factor", type=float, default=1.0, help="Escala los presupuestos (máquinas lentas)")
+    parser.add_argument("modulos", nargs="*", help="Por defecto todos los objetivos")
+    args = parser.parse_args()
+
+    fallos = 0
+    for modulo in args.modulos or OBJETIVOS:
+        presupuesto, prohibidos = OBJETIVOS.get(modulo, (float("inf"), ()))
+        presupuesto *= args.factor
+        mediciones = [medir(modulo) for _ in range(max(1, args.repeticiones))]
+        mejor = min(mediciones, key=lambda m: m["ms"])
+        cargados = set(mejor["modulos"])
+        indebidos = [p for p in prohibidos if p in cargados]
+        datos = _archivos_de_datos(mejor["abiertos"])
+
+        problemas = []
+        if mejor["ms"] > presupuesto:
+            problemas.append(f"supera {presupuesto:.0f} ms")
+        if indebidos:
+            problemas.append("carga " + ", ".join(indebidos))
+        if datos:
+            problemas.append("abre " + ", ".join(datos))
+        fallos += bool(problemas)
+        estado = "FALLA: " + "; ".join(problemas) if problemas else "OK"
+        print(f"{modulo:<28} {mejor['ms']:8.1f} ms  (presupuesto {presupuesto:6.0f} ms)  "
+              f"{len(cargados):5d} módulos  {estado}")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import tarfile
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+NIVEL_COMPRESION_DEFECTO = 6
+# Extensión de cada contenedor de salida
+EXTENSIONES = {"zip": ".zip", "xz": ".tar.xz", "zst": ".tar.zst"}
+
+
+def _zstandard():
+    """Paquete 'zstandard' (requirements.txt), importado solo si se pide .tar.zst."""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("El formato .tar.zst requiere el paquete 'zstandard' (pip install zstandard).") from None
+    return zstandard
+
+
+class _Incremental:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+        return False
+
+
+class ZipIncremental(_Incremental):
+    """
+    ZIP que se escribe a medida que llegan los archivos: cada uno se copia en
+    bloques al archivo comprimido y puede borrarse enseguida, así que en disco
+    solo conviven el ZIP parcial y el archivo en curso.
+    Se escribe en un '.part' y se renombra al cerrar sin errores.
+    Nivel 0 = sin compresión; 1-9 = deflate.
+    """
+
+    def __init__(self, destino, nivel=NIVEL_COMPRESION_DEFECTO):
+        self.destino = Path(destino)
+        self.temporal = self.destino.with_name(self.destino.name + ".part")
+        self.nivel = int(nivel)
+        if self.nivel > 0:
+            self._zip = ZipFile(self.temporal, "w", compression=ZIP_DEFLATED, compresslevel=min(self.nivel, 9))
+        else:
+            self._zip = ZipFile(self.temporal, "w", compression=ZIP_STORED)
+        self.archivos = 0
+
+    def agregar(self, ruta, arcname=None, borrar=True):
+        ruta = Path(ruta)
+        self._zip.write(ruta, arcname=arcname or ruta.name)
+        self.archivos += 1
+        if borrar:
+            ruta.unlink(missing_ok=True)
+
+    def abrir(self, arcname):
+        """Entrada nueva escrita en flujo (binaria): para contenido que se genera sin pasar por disco."""
+        self.archivos += 1
+        return self._zip.open(arcname, "w", force_zip64=True)
+
+    def cerrar(self) -> Path:
+        self._zip.close()
+        os.replace(self.temporal, self.destino)
+        return self.destino
+
+    def descartar(self):
+        self._zip.close()
+        self.temporal.unlink(missing_ok=True)
+
+
+class TarIncremental(_Incremental):
+    """
+    Tar comprimido en flujo con xz (lzma de la biblioteca estándar) o zstd
+    (paquete 'zstandard'): la compresión abarca todos los archivos a la
+    vez, así que los bloques de una misma estación, muy parecidos entre sí,
+    comprimen mejor que en un ZIP, donde cada entrada va por separado.
+    Misma interfaz que ZipIncremental salvo 'abrir': una entrada de tar declara
+    su tamaño antes del contenido, así que solo se agregan archivos completos.
+    Nivel 0-9 (preset de xz; en zstd, nivel 0 se toma como 1).
+    """
+
+    def __init__(self, destino, compresion="xz", nivel=NIVEL_COMPRESION_DEFECTO):
+        self.destino = Path(destino)
+        self.temporal = self.destino.with_name(self.destino.name + ".part")
+        self.nivel = min(int(nivel), 9)
+        self._flujo = None
+        if compresion == "xz":
+            self._tar = tarfile.open(self.temporal, "w:xz", preset=self.nivel)
+        elif compresion == "zst":
+            compresor = _zstandard().ZstdCompressor(level=max(1, self.nivel))
+            self._flujo = compresor.stream_writer(open(self.temporal, "wb"))
+            self._tar = tarfile.open(fileobj=self._flujo, mode="w|")
+        else:
+            raise ValueError(f"Compresión de tar desconocida: {compresion}")
+        self.archivos = 0
+
+    def agregar(self, ruta, arcname=None, borrar=True):
+        ruta = Path(ruta)
+        self._tar.add(ruta, arcname=arcname or ruta.name, recursive=False)
+        self.archivos += 1
+        if borrar:
+            ruta.unlink(missing_ok=True)
+
+    def _cerrar_flujos(self):
+        self._tar.close()
+        if self._flujo is not None:
+            # Cierra la trama zstd y el archivo subyacente
+            self._flujo.close()
+
+    def cerrar(self) -> Path:
+        self._cerrar_flujos()
+        os.replace(self.temporal, self.destino)
+        return self.destino
+
+    def descartar(self):
+        try:
+            self._cerrar_flujos()
+        finally:
+            self.temporal.unlink(missing_ok=True)
+
+
+def abrir_contenedor(destino, compresion="zip", nivel=NIVEL_COMPRESION_DEFECTO):
+    """ZipIncremental ('zip') o TarIncremental ('xz', 'zst') según 'compresion'."""
+    if compresion == "zip":
+        return ZipIncremental(destino, nivel)
+    return TarIncremental(destino, compresion, nivel)
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Elipsoide WGS84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+
+def distancias_km(lat_origen, lon_origen, latitudes, longitudes, max_iter=200, tolerancia=1e-12):
+    """
+    Distancia geodésica (Vincenty inverso sobre WGS84) desde un punto a un arreglo
+    de puntos, resuelta en una sola llamada vectorizada. Devuelve kilómetros.
+    Los pares que no convergen (casi antípodas) se resuelven con Karney (geopy).
+    """
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lat1 = np.radians(float(lat_origen))
+    lon1 = np.radians(float(lon_origen))
+
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(lat1))
+    u2 = np.arctan((1 - f) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    l = lon2 - lon1
+    lam = l.copy()
+    pendientes = np.ones(lam.shape, dtype=bool)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Líneas ecuatoriales: cos2_alpha = 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_nuevo = l + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            pendientes = np.abs(lam_nuevo - lam) > tolerancia
+            lam = lam_nuevo
+            if not pendientes.any():
+                break
+
+        u_cuad = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        a_coef = 1 + u_cuad / 16384 * (4096 + u_cuad * (-768 + u_cuad * (320 - 175 * u_cuad)))
+        b_coef = u_cuad / 1024 * (256 + u_cuad * (-128 + u_cuad * (74 - 47 * u_cuad)))
+        delta_sigma = b_coef * sin_sigma * (
+            cos_2sigma_m + b_coef / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - b_coef / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        distancias = WGS84_B * a_coef * (sigma - delta_sigma) / 1000.0
+
+    distancias = np.where(sin_sigma == 0, 0.0, distancias)
+    distancias = np.where(np.isnan(lat2) | np.isnan(lon2), np.nan, distancias)
+
+    # Puntos casi antípodas: Vincenty no converge, se usa Karney
+    no_convergen = np.flatnonzero(pendientes & ~np.isnan(distancias))
+    if no_convergen.size:
+        from geopy.distance import geodesic  # solo en este caso raro
+    for i in no_convergen:
+        distancias.flat[i] = geodesic(
+            (lat_origen, lon_origen), (np.degrees(lat2.flat[i]), np.degrees(lon2.flat[i]))
+        ).kilometers
+    return distancias
@@ -0,0 +1,484 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+import requests
+from common.streaming import CHUNK_SIZE
+
+# Configuración por variables de entorno (o .env):
+# - GNSS_CACHE_ROOT: raíz de la caché local; la caché HTTP vive en <raíz>/http y los
+#   datos derivados (summary parseado, SP3 en .npy) en sus propias subcarpetas
+# - GNSS_CACHE_MAX_MB: tope de la caché HTTP antes de desalojar entradas
+CACHE_RAIZ_DEFECTO = ".cache"
+CACHE_MAX_MB_DEFECTO = 2048
+
+# Reintentos de descarga con espera exponencial y jitter
+REINTENTOS = 5
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 30.0
+# Cada cuántos bytes se actualiza el punto de control de una descarga parcial
+BYTES_PUNTO_CONTROL = 8 * 1024 ** 2
+# Descargas parciales abandonadas se descartan pasado este tiempo
+HORAS_PARCIAL = 72
+_ERRORES_TRANSITORIOS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def carpeta_cache(nombre: str) -> Path:
+    """Subcarpeta de la caché local para datos derivados (tablas, índices)."""
+    carpeta = Path(os.getenv("GNSS_CACHE_ROOT", CACHE_RAIZ_DEFECTO)) / nombre
+    carpeta.mkdir(parents=True, exist_ok=True)
+    return carpeta
+
+
+class ErrorAutenticacion(Exception):
+    """El servidor devolvió una página HTML (login de Earthdata) en lugar del archivo."""
+
+
+class ErrorIntegridad(Exception):
+    """El archivo descargado no coincide con el MD5 publicado."""
+
+
+def escribir_crudo(response, destino) -> int:
+    """Escritor por defecto: guarda el cuerpo tal cual llega, en bloques."""
+    escritos = 0
+    with open(destino, "wb") as f:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            f.write(chunk)
+            escritos += len(chunk)
+    return escritos
+
+
+def espera_reintento(intento: int) -> float:
+    """Espera exponencial con jitter (entre 0.5x y 1.5x) para el intento n (desde 0)."""
+    return min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento) * random.uniform(0.5, 1.5)
+
+
+class _ReiniciarDescarga(Exception):
+    """El servidor ignoró el Range a mitad de flujo: hay que empezar de cero."""
+
+
+class FlujoReanudable:
+    """
+    Cuerpo de una descarga que sobrevive a cortes de conexión.
+
+    Los bytes recibidos (tal cual, aún comprimidos) se copian a un '.part' con un
+    punto de control al lado ('.part.ctl': URL y validadores). Ante un corte se
+    reintenta con espera y jitter pidiendo 'Range: bytes=n-' (con If-Range), y
+    una descarga interrumpida en otra ejecución continúa desde el '.part'
+    reenviando primero sus bytes al escritor. Se usa como la respuesta de
+    requests: expone status_code, headers e iter_content().
+    """
+
+    def __init__(self, session, url, parcial: Path, encabezados=None, timeout=30, reintentos=REINTENTOS):
+        self.session = session
+        self.url = url
+        self.parcial = Path(parcial)
+        self.control = self.parcial.with_name(self.parcial.name + ".ctl")
+        self.encabezados = dict(encabezados or {})
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.response = None
+        self.headers = {}
+        self.status_code = None
+        self._validadores = {}
+        self._total = None
+        self._reanudar_desde = 0
+        # MD5 de los bytes tal como llegan (incluidos los del '.part' reenviados)
+        self.md5 = hashlib.md5()
+
+        control = None
+        if self.parcial.exists():
+            try:
+                control = json.loads(self.control.read_text())
+            except (OSError, ValueError):
+                control = None
+        if control and control.get("url") == url:
+            self._validadores = {k: control.get(k) for k in ("etag", "last_modified")}
+            self._total = control.get("total")
+            self._reanudar_desde = self.parcial.stat().st_size
+        else:
+            self.descartar()
+
+    @property
+    def reanudando(self) -> bool:
+        """La petición pidió continuar un '.part' existente (Range)."""
+        return self._reanudar_desde > 0
+
+    def _if_range(self):
+        etag = self._validadores.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return self._validadores.get("last_modified")
+
+    def _pedir(self, desde: int):
+        encabezados = dict(self.encabezados)
+        if desde > 0 and self._if_range():
+            encabezados["Range"] = f"bytes={desde}-"
+            encabezados["If-Range"] = self._if_range()
+        response = self.session.get(self.url, stream=True, timeout=self.timeout, headers=encabezados)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.close()
+            raise requests.ConnectionError(f"HTTP {response.status_code} transitorio en {self.url}")
+        return response
+
+    def abrir(self):
+        """Primera petición (con reintentos). Deja status_code y headers listos para el llamador."""
+        for intento in range(self.reintentos + 1):
+            try:
+                self.response = self._pedir(self._reanudar_desde)
+                break
+            except _ERRORES_TRANSITORIOS:
+                if intento == self.reintentos:
+                    raise
+                time.sleep(espera_reintento(intento))
+        self.status_code = self.response.status_code
+        self.headers = self.response.headers
+        if self.status_code == 200:
+            # Sin soporte de Range (o el recurso cambió): se empieza de cero
+            self._reanudar_desde = 0
+            self.parcial.unlink(missing_ok=True)
+        if self.status_code in (200, 206):
+            self._registrar_respuesta(self.response)
+        return self
+
+    def _registrar_respuesta(self, response):
+        if response.status_code == 200:
+            self._validadores = {"etag": response.headers.get("ETag"),
+                                 "last_modified": response.headers.get("Last-Modified")}
+            longitud = response.headers.get("Content-Length")
+            self._total = int(longitud) if longitud else None
+            if "Content-Encoding" in response.headers:
+                # requests decodifica el cuerpo: los offsets no coinciden con los del servidor
+                self._validadores, self._total = {}, None
+        elif response.status_code == 206:
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            self._total = int(total) if total.isdigit() else self._total
+        self._guardar_control()
+
+    def _guardar_control(self):
+        self.control.write_text(json.dumps({"url": self.url, "total": self._total, **self._validadores}))
+
+    def raise_for_status(self):
+        self.response.raise_for_status()
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        # Lo ya descargado en ejecuciones anteriores va primero
+        if self.status_code == 206 and self._reanudar_desde:
+            with open(self.parcial, "rb") as f:
+                while bloque := f.read(chunk_size):
+                    self.md5.update(bloque)
+                    yield bloque
+        recibidos = self._reanudar_desde if self.status_code == 206 else 0
+        response = self.response
+        intento = 0
+        recibidos_al_fallar = recibidos
+        with open(self.parcial, "ab") as f:
+            while True:
+                try:
+                    desde_control = recibidos
+                    for bloque in response.iter_content(chunk_size=chunk_size):
+                        f.write(bloque)
+                        recibidos += len(bloque)
+                        if recibidos - desde_control >= BYTES_PUNTO_CONTROL:
+                            f.flush()
+                            desde_control = recibidos
+                        self.md5.update(bloque)
+                        yield bloque
+                    if self._total is None or recibidos >= self._total:
+                        return
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"Conexión cerrada en {recibidos} de {self._total} bytes")
+                except _ERRORES_TRANSITORIOS:
+                    f.flush()
+                    response.close()
+                    # Los reintentos se cuentan desde el último avance
+                    if recibidos > recibidos_al_fallar:
+                        intento, recibidos_al_fallar = 0, recibidos
+                    if intento == self.reintentos:
+                        raise
+                    time.sleep(espera_reintento(intento))
+                    intento += 1
+                    try:
+                        response = self._pedir(recibidos)
+                    except _ERRORES_TRANSITORIOS:
+                        response = _RespuestaFallida()
+                        continue
+                    if response.status_code != 206:
+                        response.close()
+                        if response.status_code == 200:
+                            raise _ReiniciarDescarga(self.url)
+                        response.raise_for_status()
+                        raise requests.ConnectionError(f"Respuesta {response.status_code} inesperada al reanudar")
+                    self.response = response
+                    self._registrar_respuesta(response)
+
+    def terminar(self):
+        """La descarga se completó: se eliminan el '.part' y su punto de control."""
+        self.descartar()
+
+    def descartar(self):
+        self.parcial.unlink(missing_ok=True)
+        self.control.unlink(missing_ok=True)
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+
+    def __enter__(self):
+        return self.abrir()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _RespuestaFallida:
+    """Marcador para reintentar cuando la reconexión misma falló."""
+
+    def iter_content(self, chunk_size=None):
+        raise requests.ConnectionError("Reconexión fallida")
+
+    def close(self):
+        pass
+
+
+def descargar_directo(url: str, destino, session=None, escribir=escribir_crudo, timeout=30) -> Path:
+    """
+    Descarga 'url' a 'destino' sin pasar por la caché, con los mismos reintentos y
+    reanudación que CacheHTTP.obtener (el parcial queda junto a 'destino').
+    Para datos voluminosos que se consumen una vez (bloques de alta tasa): no
+    ocupan la caché ni desalojan las entradas pequeñas y revalidables.
+    Lanza requests.HTTPError ante errores HTTP y ErrorAutenticacion si llega HTML.
+    """
+    session = session or requests
+    destino = Path(destino)
+    # Bytes tal como llegan (distinto del '.part' que usan los escritores para 'destino')
+    parcial = destino.with_name(destino.name + ".descarga")
+    for intento in range(REINTENTOS + 1):
+        flujo = FlujoReanudable(session, url, parcial, timeout=timeout)
+        try:
+            with flujo as r:
+                if r.status_code == 416 and flujo.reanudando:
+                    flujo.descartar()
+                    continue
+                r.raise_for_status()
+                if "html" in r.headers.get("Content-Type", ""):
+                    flujo.descartar()
+                    raise ErrorAutenticacion(f"HTML recibido en lugar de {url}. Verifique sus credenciales.")
+                try:
+                    escribir(r, destino)
+                except (_ReiniciarDescarga, *_ERRORES_TRANSITORIOS):
+                    raise
+                except Exception:
+                    flujo.descartar()
+                    raise
+                flujo.terminar()
+            return destino
+        except _ReiniciarDescarga:
+            flujo.descartar()
+            time.sleep(espera_reintento(intento))
+    raise requests.ConnectionError(f"Descarga interrumpida repetidamente: {url}")
+
+
+def enlazar(origen: Path, destino: Path) -> Path:
+    """Expone un archivo de la caché en otra ruta sin copiarlo (enlace duro; copia si no se puede)."""
+    destino = Path(destino)
+    destino.unlink(missing_ok=True)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copyfile(origen, destino)
+    return destino
+
+
+class CacheHTTP:
+    """
+    Caché en disco compartida por todas las descargas de CDDIS/NOAA.
+
+    - Guarda ETag/Last-Modified y revalida con GET condicional (304 = sin transferencia).
+    - Las entradas inmutables (años cerrados, semanas GPS cerradas, SP3/CRX) se sirven
+      sin consultar al servidor. Una entrada guardada como revalidable pasa a inmutable
+      solo tras una revalidación (304 o 200) pedida ya como inmutable.
+    - Las descargas se reanudan con Range tras un corte (FlujoReanudable), con
+      reintentos espaciados con jitter.
+    - Presupuesto de bytes con desalojo LRU (mtime del cuerpo = último acceso); las
+      entradas inmutables solo se desalojan si las demás no bastan.
+    """
+
+    def __init__(self, directorio=None, max_bytes=None):
+        self.directorio = Path(directorio or carpeta_cache("http"))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv("GNSS_CACHE_MAX_MB", CACHE_MAX_MB_DEFECTO)) * 1024 ** 2)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._locks_url = {}
+
+    def _rutas(self, url: str):
+        clave = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return self.directorio / clave, self.directorio / f"{clave}.json"
+
+    @staticmethod
+    def _leer_meta(ruta_meta: Path) -> Optional[dict]:
+        try:
+            return json.loads(ruta_meta.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def buscar(self, url: str) -> Optional[Path]:
+        """Ruta del cuerpo cacheado (sin red), o None si no está."""
+        cuerpo, ruta_meta = self._rutas(url)
+        if cuerpo.exists() and ruta_meta.exists():
+            return cuerpo
+        return None
+
+    def obtener(self, url: str, session=None, inmutable=False, escribir=escribir_crudo,
+                timeout=30, md5=None) -> Path:
+        """
+        Devuelve la ruta local del recurso, descargándolo o revalidándolo si hace falta.
+        'escribir(response, destino)' decide cómo se guarda el cuerpo (p. ej. ya descomprimido).
+        Con 'md5' (hash publicado de lo que envía el servidor) una entrada que ya coincide se
+        sirve sin red, y la descarga se verifica al vuelo antes de entrar en la caché.
+        Lanza requests.HTTPError ante errores HTTP, ErrorAutenticacion si llega HTML y
+        ErrorIntegridad si el MD5 no coincide.
+        """
+        session = session or requests
+        md5 = md5.lower() if md5 else None
+        cuerpo, ruta_meta = self._rutas(url)
+        meta = self._leer_meta(ruta_meta) if cuerpo.exists() else None
+        if meta and md5 and meta.get("md5") != md5:
+            # El archivo publicado cambió (o nunca se verificó): se descarga de nuevo
+            meta = None
+
+        encabezados = {}
+        if meta:
+            # Sin red solo si ya se guardó como inmutable o su MD5 coincide con el publicado.
+            # Una entrada guardada como revalidable que ahora se pide inmutable (semana o año
+            # recién cerrados) se revalida una vez antes de congelarla: pudo cambiar desde entonces
+            if meta.get("inmutable") or md5:
+                self._tocar(cuerpo, ruta_meta, meta, inmutable)
+                return cuerpo
+            if meta.get("etag"):
+                encabezados["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                encabezados["If-Modified-Since"] = meta["last_modified"]
+
+        # Una sola descarga por URL a la vez: comparten el '.part' reanudable
+        with self._lock_url(cuerpo.name):
+            for intento in range(REINTENTOS + 1):
+                flujo = FlujoReanudable(session, url, cuerpo.with_name(cuerpo.name + ".part"), encabezados, timeout)
+                try:
+                    with flujo as r:
+                        if r.status_code == 304 and meta:
+                            self._tocar(cuerpo, ruta_meta, meta, inmutable)
+                            return cuerpo
+                        if r.status_code == 416 and flujo.reanudando:
+                            # El '.part' ya tenía el cuerpo completo (o no cuadra con el servidor): desde cero
+                            flujo.descartar()
+                            continue
+                        r.raise_for_status()
+                        if "html" in r.headers.get("Content-Type", "") and not url.endswith((".html", ".htm")):
+                            flujo.descartar()
+                            raise ErrorAutenticacion(f"HTML recibido en lugar de {url}. Verifique sus credenciales.")
+
+                        temporal = cuerpo.with_name(f"{cuerpo.name}.{uuid.uuid4().hex}.tmp")
+                        try:
+                            try:
+                                escribir(r, temporal)
+                            except (_ReiniciarDescarga, *_ERRORES_TRANSITORIOS):
+                                # Un corte de red deja el '.part' para reanudar en la próxima llamada
+                                raise
+                            except Exception:
+                                # El parcial no produce un cuerpo válido (EOFError, zlib.error, OSError...):
+                                # no se reutiliza
+                                flujo.descartar()
+                                raise
+                            digest = flujo.md5.hexdigest()
+                            if md5 and digest != md5:
+                                flujo.descartar()
+                                raise ErrorIntegridad(f"MD5 {digest} distinto del publicado ({md5}) para {url}")
+                            os.replace(temporal, cuerpo)
+                        finally:
+                            temporal.unlink(missing_ok=True)
+                        flujo.terminar()
+                    break
+                except _ReiniciarDescarga:
+                    # Sin soporte de Range: se repite completa, también con espera
+                    flujo.descartar()
+                    time.sleep(espera_reintento(intento))
+            else:
+                raise requests.ConnectionError(f"Descarga interrumpida repetidamente: {url}")
+
+            meta = {
+                "url": url,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "inmutable": inmutable,
+                "bytes": cuerpo.stat().st_size,
+                "md5": digest,
+            }
+        ruta_meta.write_text(json.dumps(meta))
+        self.desalojar(proteger=cuerpo)
+        return cuerpo
+
+    def _lock_url(self, clave: str) -> threading.Lock:
+        with self._lock:
+            return self._locks_url.setdefault(clave, threading.Lock())
+
+    def _tocar(self, cuerpo: Path, ruta_meta: Path, meta: dict, inmutable: bool):
+        os.utime(cuerpo)
+        if inmutable and not meta.get("inmutable"):
+            meta["inmutable"] = True
+            ruta_meta.write_text(json.dumps(meta))
+
+    def desalojar(self, proteger: Optional[Path] = None):
+        """Elimina entradas menos usadas hasta respetar el presupuesto de bytes (salvo 'proteger')."""
+        with self._lock:
+            limite_parcial = time.time() - HORAS_PARCIAL * 3600
+            for parcial in self.directorio.glob("*.part"):
+                try:
+                    if parcial.stat().st_mtime < limite_parcial:
+                        parcial.unlink(missing_ok=True)
+                        parcial.with_name(parcial.name + ".ctl").unlink(missing_ok=True)
+                except FileNotFoundError:
+                    continue
+            entradas = []
+            total = 0
+            for ruta_meta in self.directorio.glob("*.json"):
+                cuerpo = ruta_meta.with_suffix("")
+                try:
+                    estado = cuerpo.stat()
+                except FileNotFoundError:
+                    ruta_meta.unlink(missing_ok=True)
+                    continue
+                meta = self._leer_meta(ruta_meta) or {}
+                total += estado.st_size
+                entradas.append((bool(meta.get("inmutable")), estado.st_mtime, estado.st_size, cuerpo, ruta_meta))
+            if total <= self.max_bytes:
+                return
+            # Primero las revalidables, luego las inmutables; dentro de cada grupo, la más antigua
+            for _, _, tamano, cuerpo, ruta_meta in sorted(entradas, key=lambda e: (e[0], e[1])):
+                if cuerpo == proteger:
+                    continue
+                cuerpo.unlink(missing_ok=True)
+                ruta_meta.unlink(missing_ok=True)
+                total -= tamano
+                if total <= self.max_bytes:
+                    break
+
+
+_CACHE = None
+_LOCK_CACHE = threading.Lock()
+
+
+def cache_http() -> CacheHTTP:
+    """Instancia compartida por el proceso, configurada desde el entorno."""
+    global _CACHE
+    with _LOCK_CACHE:
+        if _CACHE is None:
+            _CACHE = CacheHTTP()
+        return _CACHE
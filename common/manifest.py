@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+ESTADO_OK = "ok"
+ESTADO_ERROR = "error"
+ESTADO_NO_DISPONIBLE = "no_disponible"
+
+
+class Manifiesto:
+    """
+    Registro persistente (SQLite) del estado de cada tarea de descarga por lotes.
+    Una tarea 'ok' cuyo archivo sigue en disco no se repite; las 'error' se
+    reintentan en la siguiente ejecución.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        with self._conexion:
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS tareas (
+                    clave TEXT PRIMARY KEY,
+                    estado TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    ruta TEXT,
+                    mensaje TEXT,
+                    actualizado TEXT NOT NULL
+                )""")
+
+    def estado(self, clave: str) -> Optional[dict]:
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT estado, intentos, ruta, mensaje FROM tareas WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            return None
+        return dict(zip(("estado", "intentos", "ruta", "mensaje"), fila))
+
+    def pendiente(self, clave: str, reintentar_no_disponibles=False) -> bool:
+        """True si la tarea aún no terminó (nunca corrió, falló o su archivo ya no está)."""
+        registro = self.estado(clave)
+        if registro is None or registro["estado"] == ESTADO_ERROR:
+            return True
+        if registro["estado"] == ESTADO_NO_DISPONIBLE:
+            return reintentar_no_disponibles
+        return not (registro["ruta"] and Path(registro["ruta"]).exists())
+
+    def registrar(self, clave: str, estado: str, ruta=None, mensaje=None):
+        ahora = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock, self._conexion:
+            self._conexion.execute("""
+                INSERT INTO tareas (clave, estado, intentos, ruta, mensaje, actualizado)
+                VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT(clave) DO UPDATE SET
+                    estado = excluded.estado, intentos = tareas.intentos + 1,
+                    ruta = excluded.ruta, mensaje = excluded.mensaje, actualizado = excluded.actualizado
+            """, (clave, estado, str(ruta) if ruta else None, mensaje, ahora))
+
+    def resumen(self, claves=None) -> dict:
+        """Tareas por estado; con 'claves', solo las de esa lista (p. ej. las de la ejecución actual)."""
+        with self._lock:
+            if claves is None:
+                return dict(self._conexion.execute("SELECT estado, COUNT(*) FROM tareas GROUP BY estado").fetchall())
+            claves = list(claves)
+            conteo = {}
+            # De a 500: el límite de parámetros de SQLite
+            for i in range(0, len(claves), 500):
+                lote = claves[i:i + 500]
+                filas = self._conexion.execute(
+                    f"SELECT estado, COUNT(*) FROM tareas WHERE clave IN ({','.join('?' * len(lote))}) GROUP BY estado",
+                    lote).fetchall()
+                for estado, n in filas:
+                    conteo[estado] = conteo.get(estado, 0) + n
+            return conteo
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
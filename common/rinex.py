@@ -0,0 +1,423 @@
+"""
+Lectura en flujo de observaciones RINEX 2.x / 3.x y control de calidad por archivo.
+
+LectorRinex recorre el archivo época a época con un generador (una época en
+memoria a la vez) y entrega las líneas originales de cada registro, de modo que
+la misma lectura sirve para estadísticas y para reescribir el archivo.
+"""
+import gzip
+import io
+import math
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+# Banderas de época con observaciones (0 = OK, 1 = corte de energía, 6 = saltos de ciclo)
+BANDERAS_OBSERVACION = (0, 1, 6)
+# Un salto mayor que este múltiplo del intervalo cuenta como hueco
+FACTOR_HUECO = 1.5
+# Etiquetas de cabecera que dejan de ser válidas al unir archivos (son opcionales en RINEX)
+ETIQUETAS_POR_ARCHIVO = ("TIME OF LAST OBS", "# OF SATELLITES", "PRN / # OF OBS")
+
+
+class ErrorRinex(ValueError):
+    """El contenido no es una observación RINEX 2/3 legible."""
+
+
+class EpocaRinex(NamedTuple):
+    tiempo: Optional[datetime]
+    bandera: int
+    satelites: list
+    lineas: list
+
+
+def _abrir(ruta: Path):
+    if ruta.suffix.lower() == ".gz":
+        return gzip.open(ruta, "rt", encoding="ascii", errors="replace")
+    return open(ruta, "r", encoding="ascii", errors="replace")
+
+
+def _satelite(codigo: str) -> str:
+    """'G 5' -> 'G05'; en RINEX 2 un sistema en blanco es GPS."""
+    return (codigo[:1].strip() or "G") + codigo[1:3].replace(" ", "0")
+
+
+def _tiempo(anio, mes, dia, hora, minuto, segundos) -> datetime:
+    return datetime(anio, mes, dia, hora, minuto) + timedelta(seconds=segundos)
+
+
+class LectorRinex:
+    """
+    Observación RINEX 2/3 (texto o .gz). La cabecera se lee al crear el lector;
+    iterar entrega EpocaRinex en orden. Al terminar, 'truncado' indica si el
+    archivo acabó a mitad de un registro.
+    Con 'lineas' se lee de ese iterable (p. ej. la salida del decodificador
+    Hatanaka) en lugar de abrir 'ruta', que entonces solo nombra la fuente.
+    """
+
+    def __init__(self, ruta, lineas=None):
+        self.ruta = Path(ruta)
+        self.truncado = False
+        self._archivo = _abrir(self.ruta) if lineas is None else iter(lineas)
+        self.lineas_cabecera = []
+        self.version = None
+        self.tipos = {}
+        self.intervalo = None
+        try:
+            self._leer_cabecera()
+        except Exception:
+            self.cerrar()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def cerrar(self):
+        if hasattr(self._archivo, "close"):
+            self._archivo.close()
+
+    def _leer_cabecera(self):
+        tipo_v3 = None
+        for linea in self._archivo:
+            linea = linea.rstrip("\r\n")
+            self.lineas_cabecera.append(linea)
+            etiqueta = linea[60:].strip()
+            if etiqueta == "RINEX VERSION / TYPE":
+                self.version = linea[:9].strip()
+                if linea[20:21] not in ("O", ""):
+                    raise ErrorRinex(f"{self.ruta.name}: no es un archivo de observación")
+            elif etiqueta == "SYS / # / OBS TYPES":
+                # Las líneas de continuación empiezan en blanco y siguen el sistema anterior
+                if linea[:1].strip():
+                    tipo_v3 = linea[:1]
+                    self.tipos[tipo_v3] = []
+                elif tipo_v3 is None:
+                    raise ErrorRinex(f"{self.ruta.name}: SYS / # / OBS TYPES de continuación sin sistema")
+                self.tipos[tipo_v3] += linea[7:59].split()
+            elif etiqueta == "# / TYPES OF OBSERV":
+                self.tipos.setdefault("", [])
+                self.tipos[""] += linea[6:60].split()
+            elif etiqueta == "INTERVAL":
+                try:
+                    self.intervalo = float(linea[:10]) or None
+                except ValueError:
+                    pass
+            elif etiqueta == "END OF HEADER":
+                break
+        else:
+            raise ErrorRinex(f"{self.ruta.name}: cabecera incompleta (sin END OF HEADER)")
+        if not self.version:
+            raise ErrorRinex(f"{self.ruta.name}: falta RINEX VERSION / TYPE")
+        try:
+            self.principal = int(float(self.version))
+        except ValueError:
+            raise ErrorRinex(f"{self.ruta.name}: versión RINEX ilegible ({self.version!r})") from None
+
+    def _siguiente(self) -> Optional[str]:
+        linea = next(self._archivo, None)
+        return None if linea is None else linea.rstrip("\r\n")
+
+    def _registros(self, n: int, lineas: list) -> bool:
+        """Añade n líneas a 'lineas'; False si el archivo se acaba antes."""
+        for _ in range(n):
+            linea = self._siguiente()
+            if linea is None:
+                self.truncado = True
+                return False
+            lineas.append(linea)
+        return True
+
+    def __iter__(self):
+        return self._epocas_v3() if self.principal >= 3 else self._epocas_v2()
+
+    def _epocas_v3(self):
+        while (linea := self._siguiente()) is not None:
+            if not linea.startswith(">"):
+                if linea.strip():
+                    raise ErrorRinex(f"{self.ruta.name}: se esperaba una época y se leyó {linea[:20]!r}")
+                continue
+            try:
+                bandera, n = int(linea[31:32] or 0), int(linea[32:35])
+                tiempo = _tiempo(int(linea[2:6]), int(linea[7:9]), int(linea[10:12]), int(linea[13:15]),
+                                 int(linea[16:18]), float(linea[18:29])) if linea[2:6].strip() else None
+            except ValueError:
+                raise ErrorRinex(f"{self.ruta.name}: línea de época inválida {linea[:35]!r}") from None
+            lineas = [linea]
+            if not self._registros(n, lineas):
+                return
+            satelites = [_satelite(l[:3]) for l in lineas[1:]] if bandera in BANDERAS_OBSERVACION else []
+            yield EpocaRinex(tiempo, bandera, satelites, lineas)
+
+    def _epocas_v2(self):
+        lineas_por_satelite = max(1, math.ceil(len(self.tipos.get("", [])) / 5))
+        while (linea := self._siguiente()) is not None:
+            if not linea.strip():
+                continue
+            try:
+                bandera, n = int(linea[28:29] or 0), int(linea[29:32])
+                tiempo = None
+                if linea[1:3].strip():
+                    anio = int(linea[1:3])
+                    tiempo = _tiempo(anio + (1900 if anio >= 80 else 2000), int(linea[4:6]), int(linea[7:9]),
+                                     int(linea[10:12]), int(linea[13:15]), float(linea[15:26]))
+            except ValueError:
+                raise ErrorRinex(f"{self.ruta.name}: línea de época inválida {linea[:32]!r}") from None
+            lineas = [linea]
+            if bandera not in BANDERAS_OBSERVACION:
+                # Eventos: n líneas de registros especiales, sin lista de satélites
+                if not self._registros(n, lineas):
+                    return
+                yield EpocaRinex(tiempo, bandera, [], lineas)
+                continue
+            # Hasta 12 satélites por línea; el resto sigue en líneas de continuación
+            lista = linea[32:68].ljust(36)
+            for _ in range(math.ceil(n / 12) - 1):
+                if not self._registros(1, lineas):
+                    return
+                lista += lineas[-1][32:68].ljust(36)
+            satelites = [_satelite(lista[i:i + 3]) for i in range(0, 3 * n, 3)]
+            if not self._registros(n * lineas_por_satelite, lineas):
+                return
+            yield EpocaRinex(tiempo, bandera, satelites, lineas)
+
+
+def codigo_muestreo(intervalo_s: int) -> str:
+    """Periodo de muestreo del nombre largo RINEX 3: 1 -> '01S', 30 -> '30S', 60 -> '01M'."""
+    if intervalo_s < 60 or intervalo_s % 60:
+        return f"{intervalo_s:02d}S"
+    return f"{intervalo_s // 60:02d}M"
+
+
+def en_malla(tiempo: datetime, intervalo_s: int) -> bool:
+    """True si la época cae en un múltiplo de 'intervalo_s' contado desde la medianoche (al milisegundo)."""
+    milisegundos = round((tiempo.hour * 3600 + tiempo.minute * 60 + tiempo.second) * 1000 + tiempo.microsecond / 1000)
+    return milisegundos % (intervalo_s * 1000) == 0
+
+
+def diezmar(lineas, intervalo_s: int, nombre="rinex"):
+    """
+    Filtra en flujo las líneas de una observación RINEX dejando solo las épocas
+    sobre la malla de 'intervalo_s' segundos (los eventos se conservan). La
+    cabecera declara el nuevo INTERVAL y pierde las etiquetas de conteo que
+    dejan de ser ciertas. Devuelve un generador de líneas sin salto final.
+    """
+    lector = LectorRinex(nombre, lineas=lineas)
+    texto_intervalo = f"{intervalo_s:10.3f}".ljust(60) + "INTERVAL"
+    for linea in lector.lineas_cabecera:
+        etiqueta = linea[60:].strip()
+        if etiqueta in ETIQUETAS_POR_ARCHIVO or etiqueta == "INTERVAL":
+            continue
+        if etiqueta == "END OF HEADER":
+            yield texto_intervalo
+        yield linea
+    for epoca in lector:
+        observacion = epoca.bandera in BANDERAS_OBSERVACION and epoca.tiempo is not None
+        if observacion and not en_malla(epoca.tiempo, intervalo_s):
+            continue
+        yield from epoca.lineas
+
+
+class _ConteoQC:
+    """Épocas de observación vistas en orden: la base del control de calidad de un archivo o de un empalme."""
+
+    def __init__(self):
+        self.epocas = 0
+        self.primera = None
+        self.anterior = None
+        self.satelites = set()
+        self.saltos = {}
+
+    def agregar(self, epoca: EpocaRinex):
+        self.epocas += 1
+        self.satelites.update(epoca.satelites)
+        if self.anterior is not None:
+            salto = round((epoca.tiempo - self.anterior).total_seconds(), 3)
+            self.saltos[salto] = self.saltos.get(salto, 0) + 1
+        else:
+            self.primera = epoca.tiempo
+        self.anterior = epoca.tiempo
+
+    def completar(self, resultado: dict, intervalo=None, duracion_s=None) -> dict:
+        """Vuelca épocas, huecos, completitud y satélites en 'resultado'."""
+        resultado.update(epocas=self.epocas, primera=self.primera, ultima=self.anterior)
+        positivos = {s: n for s, n in self.saltos.items() if s > 0}
+        if intervalo is None and positivos:
+            intervalo = max(positivos, key=positivos.get)
+        resultado["intervalo"] = intervalo
+        if intervalo:
+            for salto, n in positivos.items():
+                if salto > FACTOR_HUECO * intervalo:
+                    resultado["huecos"] += n
+                    resultado["epocas_faltantes"] += n * (round(salto / intervalo) - 1)
+            if duracion_s:
+                esperadas = duracion_s / intervalo
+            else:
+                esperadas = resultado["epocas"] + resultado["epocas_faltantes"]
+            resultado["completitud"] = min(1.0, resultado["epocas"] / esperadas) if esperadas else 0.0
+        elif resultado["epocas"]:
+            resultado["completitud"] = 1.0 if not duracion_s else 0.0
+
+        conteo = {}
+        for satelite in self.satelites:
+            conteo[satelite[:1]] = conteo.get(satelite[:1], 0) + 1
+        resultado["satelites"] = conteo
+        return resultado
+
+
+def _resultado_qc(nombre: str) -> dict:
+    return {"archivo": nombre, "version": None, "epocas": 0, "primera": None, "ultima": None,
+            "intervalo": None, "huecos": 0, "epocas_faltantes": 0, "completitud": 0.0,
+            "satelites": {}, "tipos": {}, "truncado": False, "error": None}
+
+
+class EmpalmeRinex:
+    """
+    Une observaciones RINEX consecutivas en un solo archivo, en flujo y con memoria
+    constante: la cabecera sale del primer archivo agregado (sin las etiquetas que
+    describen un archivo concreto) y de cada uno se copian solo sus épocas, en
+    orden y sin repetir las ya escritas. Un bloque que falta deja un hueco en los
+    datos, nada más. Opcionalmente recorta a [inicio, fin).
+    Se escribe en un '.part' y se renombra al cerrar sin errores; con 'abrir'
+    (función que devuelve un flujo binario, p. ej. ZipIncremental.abrir) la
+    salida va directamente a ese flujo y no ocupa disco aparte.
+    Las épocas escritas se cuentan al vuelo: 'estadisticas()' da el control de
+    calidad del archivo unido (con los huecos de los bloques que faltan) sin releerlo.
+    """
+
+    def __init__(self, destino, inicio: Optional[datetime] = None, fin: Optional[datetime] = None, abrir=None):
+        self.destino = Path(destino)
+        self.temporal = self.destino.with_name(self.destino.name + ".part")
+        self.inicio, self.fin = inicio, fin
+        self._abrir = abrir
+        self.epocas = 0
+        self.archivos = 0
+        self._salida = None
+        self._tipos = None
+        self._principal = None
+        self._ultima = None
+        self._version = None
+        self._intervalo = None
+        self._conteo = _ConteoQC()
+
+    def agregar(self, ruta) -> int:
+        """Copia las épocas nuevas de 'ruta'; ErrorRinex si sus tipos de observación no coinciden."""
+        escritas = 0
+        with LectorRinex(ruta) as lector:
+            if self._salida is None:
+                self._principal, self._tipos = lector.principal, lector.tipos
+                self._version, self._intervalo = lector.version, lector.intervalo
+                if self._abrir is None:
+                    self._salida = open(self.temporal, "w", encoding="ascii", newline="\n")
+                else:
+                    self._salida = io.TextIOWrapper(self._abrir(), encoding="ascii", newline="\n")
+                cabecera = [l for l in lector.lineas_cabecera if l[60:].strip() not in ETIQUETAS_POR_ARCHIVO]
+                self._salida.write("\n".join(cabecera) + "\n")
+            elif lector.principal != self._principal or lector.tipos != self._tipos:
+                raise ErrorRinex(f"{lector.ruta.name}: versión o tipos de observación distintos al primer archivo")
+
+            for epoca in lector:
+                if epoca.tiempo is not None and epoca.bandera in BANDERAS_OBSERVACION:
+                    if self._ultima is not None and epoca.tiempo <= self._ultima:
+                        continue
+                    if (self.inicio and epoca.tiempo < self.inicio) or (self.fin and epoca.tiempo >= self.fin):
+                        continue
+                    self._ultima = epoca.tiempo
+                    self._conteo.agregar(epoca)
+                    escritas += 1
+                self._salida.write("\n".join(epoca.lineas) + "\n")
+        self.archivos += 1
+        self.epocas += escritas
+        return escritas
+
+    def estadisticas(self, duracion_s=None) -> dict:
+        """Control de calidad del archivo unido, con las mismas claves que estadisticas_rinex."""
+        resultado = _resultado_qc(self.destino.name)
+        resultado["version"] = self._version
+        resultado["tipos"] = {sistema: list(tipos) for sistema, tipos in (self._tipos or {}).items()}
+        return self._conteo.completar(resultado, self._intervalo, duracion_s)
+
+    def cerrar(self) -> Optional[Path]:
+        """Ruta del archivo unido, o None si no se agregó ninguno."""
+        if self._salida is None:
+            return None
+        self._salida.close()
+        if self._abrir is None:
+            os.replace(self.temporal, self.destino)
+        return self.destino
+
+    def descartar(self):
+        if self._salida is not None:
+            self._salida.close()
+        if self._abrir is None:
+            self.temporal.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+        return False
+
+
+def _texto_por_sistema(conteo: dict) -> str:
+    return " ".join(f"{sistema}:{n}" for sistema, n in sorted(conteo.items()))
+
+
+def estadisticas_rinex(ruta, duracion_s=None) -> dict:
+    """
+    Control de calidad de una observación RINEX en una sola pasada: épocas,
+    huecos (saltos mayores que 1.5 veces el intervalo), satélites por
+    constelación y tipos de observación. Con 'duracion_s' (p. ej. 900 para un
+    bloque de 15 min) la completitud se mide contra lo esperado en ese lapso.
+    Nunca lanza: un archivo ilegible se informa en 'error'.
+    """
+    ruta = Path(ruta)
+    resultado = _resultado_qc(ruta.name)
+    conteo = _ConteoQC()
+    try:
+        with LectorRinex(ruta) as lector:
+            resultado["version"] = lector.version
+            resultado["tipos"] = {sistema: list(tipos) for sistema, tipos in lector.tipos.items()}
+            for epoca in lector:
+                if epoca.bandera not in BANDERAS_OBSERVACION or epoca.tiempo is None:
+                    continue
+                conteo.agregar(epoca)
+            resultado["truncado"] = lector.truncado
+            intervalo = lector.intervalo
+    except (OSError, ValueError, EOFError) as e:
+        # ValueError incluye ErrorRinex y cualquier campo numérico mal formado
+        resultado["error"] = str(e)
+        resultado["truncado"] = True
+        intervalo = None
+    return conteo.completar(resultado, intervalo, duracion_s)
+
+
+def resumen_qc(estadisticas: dict) -> dict:
+    """Fila legible de la tabla de calidad para mostrar en la interfaz."""
+    if estadisticas["error"]:
+        estado = "UNREADABLE"
+    elif estadisticas["epocas"] == 0:
+        estado = "EMPTY"
+    elif estadisticas["truncado"]:
+        estado = "TRUNCATED"
+    elif estadisticas["huecos"]:
+        estado = "GAPS"
+    else:
+        estado = "OK"
+    return {
+        "File": estadisticas["archivo"],
+        "Status": estado,
+        "Epochs": estadisticas["epocas"],
+        "Completeness_%": round(100 * estadisticas["completitud"], 1),
+        "Gaps": estadisticas["huecos"],
+        "Missing_epochs": estadisticas["epocas_faltantes"],
+        "Satellites": _texto_por_sistema(estadisticas["satelites"]),
+        "Obs_types": _texto_por_sistema({s or "*": len(t) for s, t in estadisticas["tipos"].items()}),
+    }
@@ -0,0 +1,114 @@
+"""
+Publicación de resultados en la carpeta static/ de Streamlit (enableStaticServing).
+
+El servidor entrega esos archivos desde disco en bloques, así que la memoria
+del proceso no depende del tamaño del resultado (a diferencia de
+st.download_button, que carga los bytes en la sesión).
+"""
+import html
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from common.http_cache import enlazar
+
+# static/ junto a main.py; Streamlit lo sirve en /app/static/
+CARPETA_STATIC = Path(__file__).resolve().parent.parent / "static"
+SUBCARPETA_DESCARGAS = "descargas"
+RUTA_PUBLICA = "app/static"
+# Límite del servidor estático de Streamlit por archivo
+MAX_BYTES_STATIC = 200 * 1024 * 1024
+HORAS_RETENCION = 6
+
+
+def limpiar_publicados(horas=HORAS_RETENCION):
+    """Borra las descargas publicadas hace más de 'horas'."""
+    carpeta = CARPETA_STATIC / SUBCARPETA_DESCARGAS
+    if not carpeta.exists():
+        return
+    limite = time.time() - horas * 3600
+    for subcarpeta in carpeta.iterdir():
+        try:
+            if subcarpeta.stat().st_mtime < limite:
+                shutil.rmtree(subcarpeta, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+
+def publicar(ruta, mover=True) -> Optional[str]:
+    """
+    Deja 'ruta' en static/descargas/<token>/ y devuelve su URL relativa.
+    Con mover=False se enlaza (sin copiar si el sistema de archivos lo permite).
+    Devuelve None si el archivo supera el límite del servidor estático.
+    """
+    ruta = Path(ruta)
+    if ruta.stat().st_size > MAX_BYTES_STATIC:
+        return None
+    limpiar_publicados()
+    token = uuid.uuid4().hex
+    carpeta = CARPETA_STATIC / SUBCARPETA_DESCARGAS / token
+    carpeta.mkdir(parents=True, exist_ok=True)
+    destino = carpeta / ruta.name
+    if mover:
+        shutil.move(ruta, destino)
+    else:
+        enlazar(ruta, destino)
+    return f"{RUTA_PUBLICA}/{SUBCARPETA_DESCARGAS}/{token}/{ruta.name}"
+
+
+def partir(ruta, tamano=None, borrar=False) -> list[Path]:
+    """
+    Divide 'ruta' en partes de a lo sumo 'tamano' bytes (por defecto el límite del
+    servidor estático): 'nombre.001', '.002', ...
+    copiando en bloques, sin cargarlo en memoria. Se reúnen concatenándolas en orden.
+    """
+    ruta = Path(ruta)
+    tamano = tamano or MAX_BYTES_STATIC
+    partes = []
+    with open(ruta, "rb") as f_in:
+        while True:
+            parte = ruta.with_name(f"{ruta.name}.{len(partes) + 1:03d}")
+            with open(parte, "wb") as f_out:
+                copiados = 0
+                while copiados < tamano and (bloque := f_in.read(min(1024 * 1024, tamano - copiados))):
+                    f_out.write(bloque)
+                    copiados += len(bloque)
+            if not copiados:
+                parte.unlink()
+                break
+            partes.append(parte)
+    if borrar:
+        ruta.unlink()
+    return partes
+
+
+def _enlace(url, nombre, etiqueta):
+    import streamlit as st
+
+    # El atributo download fuerza a guardar el archivo aunque llegue como text/plain
+    st.markdown(
+        f'<a href="{html.escape(url)}" download="{html.escape(nombre)}">{html.escape(etiqueta)}</a>',
+        unsafe_allow_html=True,
+    )
+
+
+def mostrar_descarga(ruta, etiqueta, mover=True):
+    """
+    Enlace de descarga servido desde disco. Un archivo mayor que el límite del
+    servidor estático se publica en partes, también desde disco: la memoria del
+    proceso no crece con el tamaño del resultado.
+    """
+    import streamlit as st
+
+    ruta = Path(ruta)
+    url = publicar(ruta, mover=mover)
+    if url is not None:
+        _enlace(url, ruta.name, etiqueta)
+        return
+    partes = partir(ruta, borrar=mover)
+    st.info(f"{ruta.name} exceeds the {MAX_BYTES_STATIC // 1024 ** 2} MB static serving limit, so it is split "
+            f"into {len(partes)} parts. Join them in order: `cat {ruta.name}.0* > {ruta.name}` "
+            f"(Linux/macOS) or `copy /b {ruta.name}.001+{ruta.name}.002+... {ruta.name}` (Windows).")
+    for parte in partes:
+        _enlace(publicar(parte), parte.name, f"{etiqueta} ({parte.suffix[1:]}/{len(partes):03d})")
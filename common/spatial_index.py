@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import numpy as np
+from common.geodesy import WGS84_A, WGS84_F, distancias_km
+
+_INDICES = {}
+_LOCK = threading.Lock()
+
+
+def geodesicas_a_ecef(latitudes, longitudes, alturas=0.0):
+    """Convierte latitud/longitud (grados) y altura elipsoidal (m) a ECEF (m) sobre WGS84."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    e2 = WGS84_F * (2 - WGS84_F)
+    n = WGS84_A / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    x = (n + alturas) * np.cos(lat) * np.cos(lon)
+    y = (n + alturas) * np.cos(lat) * np.sin(lon)
+    z = (n * (1 - e2) + alturas) * np.sin(lat)
+    return np.column_stack([x, y, z])
+
+
+class IndiceEspacial:
+    """
+    Árbol k-d en ECEF sobre las estaciones proyectadas al elipsoide.
+    La cuerda nunca supera a la geodésica, así que el árbol acota los candidatos
+    y la distancia exacta (Vincenty) decide el orden final.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        from scipy.spatial import cKDTree  # scipy solo se carga al construir el primer índice
+
+        validos = ~(np.isnan(self.latitudes) | np.isnan(self.longitudes))
+        self._posiciones = np.flatnonzero(validos)
+        self._arbol = cKDTree(geodesicas_a_ecef(self.latitudes[validos], self.longitudes[validos]))
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def _ordenar(self, lat, lon, candidatos):
+        posiciones = self._posiciones[candidatos]
+        distancias = distancias_km(lat, lon, self.latitudes[posiciones], self.longitudes[posiciones])
+        orden = np.argsort(distancias, kind="stable")
+        return posiciones[orden], distancias[orden]
+
+    def en_radio(self, lat, lon, radio_km):
+        """Posiciones y distancias (km) de todas las estaciones a menos de radio_km, de menor a mayor."""
+        punto = geodesicas_a_ecef(lat, lon)[0]
+        candidatos = np.asarray(self._arbol.query_ball_point(punto, r=radio_km * 1000.0), dtype=np.intp)
+        posiciones, distancias = self._ordenar(lat, lon, candidatos)
+        dentro = distancias <= radio_km
+        return posiciones[dentro], distancias[dentro]
+
+    def k_cercanas(self, lat, lon, k):
+        """Posiciones y distancias (km) de las k estaciones más cercanas, de menor a mayor."""
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        punto = geodesicas_a_ecef(lat, lon)[0]
+        _, candidatos = self._arbol.query(punto, k=k)
+        _, distancias = self._ordenar(lat, lon, np.atleast_1d(candidatos))
+        # Toda estación más cercana que la k-ésima tiene una cuerda menor que esa geodésica
+        candidatos = np.asarray(self._arbol.query_ball_point(punto, r=distancias[-1] * 1000.0), dtype=np.intp)
+        posiciones, distancias = self._ordenar(lat, lon, candidatos)
+        return posiciones[:k], distancias[:k]
+
+
+def obtener_indice(latitudes, longitudes):
+    """Devuelve el índice del catálogo, construyéndolo una sola vez por proceso."""
+    lat = np.ascontiguousarray(latitudes, dtype=np.float64)
+    lon = np.ascontiguousarray(longitudes, dtype=np.float64)
+    clave = hashlib.blake2b(lat.tobytes() + lon.tobytes(), digest_size=16).digest()
+    with _LOCK:
+        indice = _INDICES.get(clave)
+        if indice is None:
+            indice = _INDICES[clave] = IndiceEspacial(lat, lon)
+    return indice
+
+
+def estaciones_cercanas(df, latitud, longitud, col_lat, col_lon, n=5, radio_km=None):
+    """
+    Filas de df más cercanas al punto (las n primeras, o todas dentro de radio_km)
+    junto con sus distancias en km, ordenadas de menor a mayor.
+    """
+    indice = obtener_indice(df[col_lat].to_numpy(), df[col_lon].to_numpy())
+    if radio_km is None:
+        posiciones, distancias = indice.k_cercanas(latitud, longitud, n)
+    else:
+        posiciones, distancias = indice.en_radio(latitud, longitud, radio_km)
+    return df.iloc[posiciones].copy(), distancias
@@ -0,0 +1,109 @@
+"""
+Registro único de estaciones (IGS y NOAA CORS), cargado una vez por proceso.
+
+Los catálogos se normalizan con tipos compactos (categóricos, coordenadas
+float32, booleano para 'Rate 1s') y se comparten entre sesiones con
+st.cache_resource: las columnas numéricas son de solo lectura y quien necesite
+modificar filas debe copiarlas (df.iloc[...].copy()).
+"""
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+RUTA_IGS = "data/igs_stations.csv"
+RUTA_NOAA = "data/noaa_cors.csv"
+# Columnas de texto con pocos valores distintos se guardan como categóricas
+_MAX_FRACCION_CATEGORIA = 0.5
+
+
+def version_archivos(*rutas):
+    """Identifica la versión de los CSV (ruta, mtime, tamaño) para invalidar las cachés."""
+    return tuple((str(ruta), os.stat(ruta).st_mtime_ns, os.stat(ruta).st_size) for ruta in rutas)
+
+
+def _solo_lectura(valores, dtype) -> np.ndarray:
+    arreglo = np.array(valores, dtype=dtype)
+    arreglo.setflags(write=False)
+    return arreglo
+
+
+def _compactar(df: pd.DataFrame, coordenadas, booleanas=()) -> pd.DataFrame:
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in coordenadas:
+            columnas[columna] = _solo_lectura(pd.to_numeric(serie, errors="coerce"), np.float32)
+        elif columna in booleanas:
+            columnas[columna] = _solo_lectura(serie.astype(str).str.strip().str.upper() == "SI", bool)
+        elif serie.dtype == object and serie.nunique() <= _MAX_FRACCION_CATEGORIA * len(serie):
+            columnas[columna] = serie.astype("category")
+        else:
+            columnas[columna] = serie.to_numpy()
+    return pd.DataFrame(columnas, copy=False)
+
+
+class RegistroEstaciones:
+    """Catálogo de estaciones con búsqueda O(1) por el código de 4 caracteres."""
+
+    def __init__(self, df: pd.DataFrame, columna_nombre: str):
+        self.df = df
+        self.columna_nombre = columna_nombre
+        codigos = df[columna_nombre].astype(str).str[:4].str.upper().to_numpy()
+        # La primera aparición de cada código es la que se usa
+        self._posiciones = {}
+        for posicion, codigo in enumerate(codigos):
+            self._posiciones.setdefault(codigo, posicion)
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, codigo) -> bool:
+        return str(codigo)[:4].upper() in self._posiciones
+
+    def posicion(self, codigo):
+        return self._posiciones.get(str(codigo)[:4].upper())
+
+    def fila(self, codigo):
+        """Fila de la estación (por código o nombre completo) o None."""
+        posicion = self.posicion(codigo)
+        return None if posicion is None else self.df.iloc[posicion]
+
+    def valor(self, codigo, columna, defecto=None):
+        posicion = self.posicion(codigo)
+        if posicion is None or columna not in self.df.columns:
+            return defecto
+        return self.df[columna].iat[posicion]
+
+    def codigos_con(self, columna) -> set:
+        """Códigos de las estaciones cuya columna booleana es True."""
+        marcadas = self.df[columna].to_numpy()
+        return {codigo for codigo, posicion in self._posiciones.items() if marcadas[posicion]}
+
+
+@st.cache_resource(show_spinner=False)
+def _registro_igs(ruta, version):
+    df = pd.read_csv(ruta, sep=",", header=0)
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.rename(columns={"latitude": "latitud", "longitude": "longitud", "site name": "estacion"})
+    df = _compactar(df, coordenadas=("latitud", "longitud"), booleanas=("rate 1s", "rate 30s"))
+    return RegistroEstaciones(df, "estacion")
+
+
+@st.cache_resource(show_spinner=False)
+def _registro_noaa(ruta, version):
+    df = pd.read_csv(ruta, sep=",")
+    df.columns = df.columns.str.lower().str.strip()
+    df = df.rename(columns={"siteid": "Station", "y": "Latitude", "x": "Longitude"})
+    df = _compactar(df, coordenadas=("Latitude", "Longitude"))
+    return RegistroEstaciones(df, "Station")
+
+
+def registro_igs(ruta=RUTA_IGS) -> RegistroEstaciones:
+    """Catálogo IGS compartido (se recarga solo si el CSV cambia)."""
+    return _registro_igs(ruta, version_archivos(ruta))
+
+
+def registro_noaa(ruta=RUTA_NOAA) -> RegistroEstaciones:
+    """Catálogo NOAA CORS compartido (se recarga solo si el CSV cambia)."""
+    return _registro_noaa(ruta, version_archivos(ruta))
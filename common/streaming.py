@@ -0,0 +1,50 @@
+import os
+import zlib
+from pathlib import Path
+
+CHUNK_SIZE = 64 * 1024
+# Límite de salida por llamada al descompresor: acota la memoria aunque el ratio sea alto
+_MAX_SALIDA = 16 * CHUNK_SIZE
+
+
+def escribir_gunzip(chunks, destino) -> int:
+    """
+    Descomprime un flujo gzip (uno o varios miembros) directamente a 'destino'
+    con memoria acotada. Escribe primero a un '.part' y lo renombra al terminar.
+    Devuelve el número de bytes descomprimidos.
+    """
+    destino = Path(destino)
+    temporal = destino.with_name(destino.name + ".part")
+    decompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    con_datos = False
+    escritos = 0
+    try:
+        with open(temporal, "wb") as f_out:
+            for chunk in chunks:
+                while chunk:
+                    con_datos = True
+                    datos = decompresor.decompress(chunk, _MAX_SALIDA)
+                    f_out.write(datos)
+                    escritos += len(datos)
+                    if decompresor.eof:
+                        # Siguiente miembro gzip (o relleno de ceros al final)
+                        chunk = decompresor.unused_data.lstrip(b"\x00")
+                        decompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        con_datos = False
+                    else:
+                        chunk = decompresor.unconsumed_tail
+            resto = decompresor.flush()
+            f_out.write(resto)
+            escritos += len(resto)
+        if con_datos and not decompresor.eof:
+            raise EOFError(f"Flujo gzip incompleto para {destino.name}")
+        os.replace(temporal, destino)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+    return escritos
+
+
+def descomprimir_respuesta(response, destino, chunk_size=CHUNK_SIZE) -> int:
+    """Escribe el cuerpo .gz de una respuesta requests (stream=True) ya descomprimido."""
+    return escribir_gunzip(response.iter_content(chunk_size=chunk_size), destino)
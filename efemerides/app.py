@@ -1,8 +1,59 @@
 import streamlit as st
+from datetime import timedelta
 from efemerides.generate_date import obtener_anio_doy_semana
-from efemerides.generate_files import construir_url_sp3, descargar_y_descomprimir_sp3
+from efemerides.generate_files import construir_url_sp3, descargar_rango_sp3, descargar_y_descomprimir_sp3
 from efemerides.instituciones_diccionario import instituciones
-from efemerides.summary_checker import archivo_esta_disponible
+from efemerides.summary_checker import md5_publicado, obtener_md5sums
+from efemerides.best_orbits import mejores_orbitas
+from common.serving import mostrar_descarga
+
+# Los MD5SUMS de semanas abiertas cambian durante el día: la búsqueda global se comparte entre sesiones unos minutos
+TTL_BUSQUEDA_GLOBAL = 600
+MAX_DIAS_RANGO = 31
+
+@st.cache_data(ttl=TTL_BUSQUEDA_GLOBAL, show_spinner=False)
+def _mejores_orbitas(fecha):
+    return mejores_orbitas(fecha)
+
+def _limpiar_seleccion():
+    for clave in list(st.session_state.keys()):
+        if clave.startswith(("url_", "nombre_", "md5_")):
+            del st.session_state[clave]
+
+def _modo_rango(institucion, producto_deseado):
+    """Órbitas diarias consecutivas de una institución unidas en un solo SP3."""
+    productos_validos = [p for p in instituciones[institucion]["productos"] if p["producto"] == producto_deseado]
+    if not productos_validos:
+        st.warning(f"The institution {institucion} does not have products {producto_deseado}.")
+        return
+    rango = st.date_input("Select date range", value=[], format="YYYY-MM-DD")
+    producto = productos_validos[0]
+    if len(productos_validos) > 1:
+        tipo = st.radio("Product line", [p["tipo"] for p in productos_validos], horizontal=True)
+        producto = next(p for p in productos_validos if p["tipo"] == tipo)
+
+    if st.button("🧵 Download merged orbit (.SP3)"):
+        if len(rango) != 2:
+            st.warning("Please select a start and an end date.")
+            return
+        inicio, fin = rango
+        if (fin - inicio).days + 1 > MAX_DIAS_RANGO:
+            st.warning(f"The range cannot exceed {MAX_DIAS_RANGO} days.")
+            return
+        with st.spinner("Downloading and merging daily orbits..."):
+            # Un MD5SUMS por semana GPS del rango: verifica cada día y evita pedir los no publicados
+            md5s = {}
+            semanas = {obtener_anio_doy_semana((inicio + timedelta(days=i)).strftime("%Y-%m-%d"))[2]
+                       for i in range((fin - inicio).days + 1)}
+            for semana in sorted(semanas):
+                md5s.update(obtener_md5sums(semana) or {})
+            ruta, faltantes = descargar_rango_sp3(institucion, producto["tipo"], producto_deseado,
+                                                  producto["sampling"], inicio, fin, md5s=md5s)
+        if ruta:
+            st.success(f"✅ {(fin - inicio).days + 1} days merged: {ruta.name}")
+            mostrar_descarga(ruta, f"📎 Download {ruta.name}", mover=False)
+        else:
+            st.error("❌ Missing days: " + ", ".join(d.strftime("%Y-%m-%d") for d in faltantes))
 
 def main():
     st.title("📡 Precise Orbits Download")
@@ -16,6 +67,10 @@ def main():
     # Tipo de efeméride
     tipo_efemeride = st.radio("Type of Orbits", ["Final Solution", "Rapid Solution"], horizontal=True)
 
+    if st.radio("Mode", ["Single day", "Date range"], horizontal=True) == "Date range":
+        _modo_rango(institucion, "FIN" if tipo_efemeride == "Final Solution" else "RAP")
+        return
+
     # Selección de fecha
     fecha = st.date_input("Select date", format="YYYY-MM-DD")
 
@@ -26,9 +81,7 @@ def main():
         producto_deseado = "FIN" if tipo_efemeride == "Final Solution" else "RAP"
 
         # Limpiar session_state previo
-        for clave in list(st.session_state.keys()):
-            if clave.startswith("url_") or clave.startswith("nombre_"):
-                del st.session_state[clave]
+        _limpiar_seleccion()
 
         # Buscar productos compatibles
         productos_validos = [
@@ -43,16 +96,37 @@ def main():
             muestreo = producto["sampling"]
             url, nombre_archivo = construir_url_sp3(semana, institucion, tipo, producto_deseado, anio, doy, muestreo)
 
-            if archivo_esta_disponible(nombre_archivo, semana):
+            md5 = md5_publicado(nombre_archivo, semana)
+            if md5:
                 key_url = f"url_{tipo}"
                 key_nombre = f"nombre_{tipo}"
                 st.session_state[key_url] = url
                 st.session_state[key_nombre] = nombre_archivo
+                st.session_state[f"md5_{tipo}"] = md5
                 st.success(f"✅ File available: {nombre_archivo}")
                 
             else:
                 st.warning(f"⚠️ The file {nombre_archivo} is not yet available on the server.")
 
+    # Búsqueda en todas las instituciones: un MD5SUMS por semana y tabla ordenada de mejor a peor
+    if st.button("🏆 Best available orbit (all institutions)"):
+        with st.spinner("Checking every analysis center..."):
+            filas, errores = _mejores_orbitas(fecha)
+        for semana, error in errores.items():
+            st.warning(f"⚠️ MD5SUMS of GPS week {semana} could not be read: {error}")
+        _limpiar_seleccion()
+        if not filas:
+            st.warning("No FIN/RAP orbits are published yet for this date.")
+        else:
+            st.dataframe([{k: v for k, v in fila.items() if k not in ("URL", "MD5")} for fila in filas],
+                         hide_index=True)
+            mejor = filas[0]
+            clave = f"{mejor['Institution']}_{mejor['Type']}_{mejor['Product']}"
+            st.session_state[f"url_{clave}"] = mejor["URL"]
+            st.session_state[f"nombre_{clave}"] = mejor["File"]
+            st.session_state[f"md5_{clave}"] = mejor["MD5"]
+            st.success(f"✅ Best available: {mejor['File']}")
+
     # Botón único para descargar todo
     tipos_disponibles = [k.replace("url_", "") for k in st.session_state if k.startswith("url_")]
     if tipos_disponibles:
@@ -60,11 +134,11 @@ def main():
             for tipo in tipos_disponibles:
                 url = st.session_state[f"url_{tipo}"]
                 nombre = st.session_state[f"nombre_{tipo}"]
-                ruta = descargar_y_descomprimir_sp3(url, nombre)
+                ruta = descargar_y_descomprimir_sp3(url, nombre, md5=st.session_state.get(f"md5_{tipo}"))
 
                 if ruta:
                     st.success(f"📥 {tipo} uncompressed: {ruta.name}")
-                    st.download_button(f"📎 Download File", ruta.read_bytes(), file_name=ruta.name)
+                    mostrar_descarga(ruta, f"📎 Download {ruta.name}", mover=False)
                 else:
                     st.error(f"❌The file could not be downloaded {nombre}")
 
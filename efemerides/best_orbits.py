@@ -0,0 +1,107 @@
+"""
+Mejor órbita disponible para una fecha, en todos los centros de análisis a la vez.
+
+Se lee una sola vez el MD5SUMS de la semana GPS de la fecha (y, en paralelo, el
+de las semanas vecinas, donde pueden estar productos que cruzan el límite de
+semana) y se cruzan sus nombres con todos los productos de
+'instituciones_diccionario'. El resultado es una tabla ordenada de mejor a peor:
+FIN antes que RAP, cobertura completa del día antes que parcial, muestreo más fino
+y, a igualdad, la semana de la propia fecha.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import requests
+from efemerides.generate_date import obtener_anio_doy_semana
+from efemerides.generate_files import URL_PRODUCTOS
+from efemerides.instituciones_diccionario import instituciones
+from efemerides.summary_checker import leer_md5sums, semana_gps_actual
+
+PRIORIDAD_PRODUCTO = {"FIN": 0, "RAP": 1}
+SEMANAS_VECINAS = 1
+
+# COD0MGXFIN_20250010000_01D_05M_ORB.SP3.gz
+_PATRON_SP3 = re.compile(
+    r"^(?P<centro>[A-Z0-9]{3})0(?P<tipo>[A-Z]{3})(?P<producto>[A-Z]{3})_"
+    r"(?P<inicio>\d{11})_(?P<duracion>\d{2}[DHMS])_(?P<muestreo>\d{2}[DHMS])_ORB\.SP3\.gz$")
+_UNIDADES = {"D": 86400, "H": 3600, "M": 60, "S": 1}
+
+
+def _segundos(periodo: str) -> int:
+    """'01D', '15M', '30S'... a segundos."""
+    return int(periodo[:-1]) * _UNIDADES[periodo[-1]]
+
+
+def _inicio(texto: str) -> datetime:
+    """YYYYDDDHHMM del nombre largo a datetime."""
+    return datetime.strptime(texto, "%Y%j%H%M")
+
+
+def _productos_catalogo(catalogo, productos) -> set:
+    return {(centro, p["tipo"], p["producto"])
+            for centro, datos in catalogo.items()
+            for p in datos["productos"] if p["producto"] in productos}
+
+
+def _leer_semana(semana: int):
+    """(hashes, error) de una semana; un 404 equivale a una semana aún sin publicar."""
+    try:
+        return leer_md5sums(semana), None
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return {}, None
+        return {}, str(e)
+    except Exception as e:
+        return {}, f"{type(e).__name__}: {e}"
+
+
+def mejores_orbitas(fecha, productos=("FIN", "RAP"), catalogo=None, vecinas=SEMANAS_VECINAS):
+    """
+    Órbitas SP3 que cubren 'fecha' en todos los centros de 'catalogo' (por defecto
+    todas las instituciones), ordenadas de mejor a peor.
+    Devuelve (filas, errores): filas es una lista de dicts con Institution, Type,
+    Product, Sampling, Coverage (fracción del día), Week, File, URL y MD5;
+    errores es {semana GPS: mensaje} de los MD5SUMS que no se pudieron leer.
+    """
+    catalogo = instituciones if catalogo is None else catalogo
+    dia = fecha if isinstance(fecha, date) and not isinstance(fecha, datetime) else fecha.date()
+    _, _, semana = obtener_anio_doy_semana(dia.strftime("%Y-%m-%d"))
+    semanas = [s for s in range(semana - vecinas, semana + vecinas + 1) if s <= semana_gps_actual()]
+    buscados = _productos_catalogo(catalogo, productos)
+
+    with ThreadPoolExecutor(max_workers=len(semanas) or 1) as pool:
+        leidas = dict(zip(semanas, pool.map(_leer_semana, semanas)))
+
+    inicio_dia = datetime.combine(dia, datetime.min.time())
+    fin_dia = inicio_dia + timedelta(days=1)
+    filas, vistos = [], set()
+    for semana_archivo, (hashes, _) in leidas.items():
+        for nombre, md5 in hashes.items():
+            partes = _PATRON_SP3.match(nombre)
+            if partes is None or nombre in vistos:
+                continue
+            clave = (partes["centro"], partes["tipo"], partes["producto"])
+            if clave not in buscados:
+                continue
+            inicio = _inicio(partes["inicio"])
+            fin = inicio + timedelta(seconds=_segundos(partes["duracion"]))
+            solape = (min(fin, fin_dia) - max(inicio, inicio_dia)).total_seconds()
+            if solape <= 0:
+                continue
+            vistos.add(nombre)
+            filas.append({
+                "Institution": partes["centro"],
+                "Type": partes["tipo"],
+                "Product": partes["producto"],
+                "Sampling": partes["muestreo"],
+                "Coverage": round(solape / 86400, 3),
+                "Week": semana_archivo,
+                "File": nombre,
+                "URL": f"{URL_PRODUCTOS}/{semana_archivo}/{nombre}",
+                "MD5": md5,
+            })
+
+    filas.sort(key=lambda f: (PRIORIDAD_PRODUCTO.get(f["Product"], len(PRIORIDAD_PRODUCTO)), -f["Coverage"],
+                              _segundos(f["Sampling"]), abs(f["Week"] - semana), f["Institution"], f["Type"]))
+    errores = {s: error for s, (_, error) in leidas.items() if error}
+    return filas, errores
@@ -1,51 +1,87 @@
-import gzip
-import shutil
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
-from tempfile import TemporaryDirectory
 from IGS.authenticator import SessionWithHeaderRedirection
+from common.http_cache import ErrorAutenticacion, ErrorIntegridad, cache_http, enlazar
+from common.streaming import descomprimir_respuesta
+from efemerides.generate_date import obtener_anio_doy_semana
+
+URL_PRODUCTOS = "https://cddis.nasa.gov/archive/gnss/products"
+WORKERS_RANGO = 4
 
 def construir_url_sp3(semana_gps, centro, tipo, producto, year, doy, muestreo="05M", duracion="01D", hora=0, minuto=0):
     ddd = f"{doy:03d}"
     hh = f"{hora:02d}"
     mm = f"{minuto:02d}"
     nombre_archivo = f"{centro}0{tipo}{producto}_{year}{ddd}{hh}{mm}_{duracion}_{muestreo}_ORB.SP3.gz"
-    url = f"https://cddis.nasa.gov/archive/gnss/products/{semana_gps}/{nombre_archivo}"
+    url = f"{URL_PRODUCTOS}/{semana_gps}/{nombre_archivo}"
     return url, nombre_archivo
-def descargar_y_descomprimir_sp3(url, nombre_archivo, carpeta_final="descargas"):
+def descargar_y_descomprimir_sp3(url, nombre_archivo, carpeta_final="descargas", md5=None):
     try:
         carpeta_destino = Path(carpeta_final)
-        carpeta_destino.mkdir(exist_ok=True)
+        carpeta_destino.mkdir(parents=True, exist_ok=True)
+
+        sp3_path = carpeta_destino / nombre_archivo.replace(".gz", "")
 
-        with TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            gz_path = temp_path / nombre_archivo
-            sp3_path = carpeta_destino / nombre_archivo.replace(".gz", "")
+        # Crear sesión autenticada con Earthdata
+        session = SessionWithHeaderRedirection()
+        session.headers.update({"User-Agent": "Mozilla/5.0"})
 
-            # Crear sesión autenticada con Earthdata
-            session = SessionWithHeaderRedirection()
-            session.headers.update({"User-Agent": "Mozilla/5.0"})
+        # Los SP3 publicados no cambian: la caché guarda el .SP3 ya descomprimido en flujo.
+        # Con el MD5 del MD5SUMS, una copia ya verificada se sirve sin red y la descarga se verifica al vuelo
+        ruta_cache = cache_http().obtener(url, session, inmutable=True, escribir=descomprimir_respuesta, md5=md5)
+        return enlazar(ruta_cache, sp3_path)
 
-            response = session.get(url, stream=True, timeout=30)
+    except ErrorAutenticacion:
+        print("⚠️ Wrong (401). Verify your credential.")
+    except ErrorIntegridad as e:
+        print(f"❌ Corrupted download: {e}")
+    except requests.HTTPError as e:
+        response = e.response
+        if response.status_code == 401:
+            print("⚠️ Wrong (401). Verify your credential.")
+        elif response.status_code == 404:
+            print(f"⚠️ Not found: {url}")
+        else:
+            print(f"⚠️ HTTP error {response.status_code}: {response.reason}")
+    except Exception as e:
+        print(f"❌ General error: {e}")
 
-            if response.status_code == 200:
-                with open(gz_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+    return None
 
-                # Descomprimir el archivo .gz a .SP3
-                with gzip.open(gz_path, "rb") as f_in, open(sp3_path, "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+def descargar_rango_sp3(centro, tipo, producto, muestreo, fecha_inicio, fecha_fin, carpeta_final="descargas",
+                        md5s=None, workers=WORKERS_RANGO):
+    """
+    Órbitas diarias de un centro entre dos fechas (inclusive), descargadas en paralelo
+    y unidas en flujo en un solo SP3 continuo, sin épocas repetidas en los cambios de día.
+    'md5s' ({nombre: md5}, p. ej. de los MD5SUMS de las semanas del rango) verifica cada
+    día y descarta de antemano los no publicados.
+    Devuelve (ruta del SP3 unido o None, lista de días que faltan).
+    """
+    from efemerides.sp3 import unir_sp3
 
-                return sp3_path
+    dias = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+    solicitudes = []
+    for dia in dias:
+        anio, doy, semana = obtener_anio_doy_semana(dia.strftime("%Y-%m-%d"))
+        url, nombre = construir_url_sp3(semana, centro, tipo, producto, anio, doy, muestreo)
+        solicitudes.append((dia, url, nombre))
 
-            elif response.status_code == 401:
-                print("⚠️ Wrong (401). Verify your credential.")
-            elif response.status_code == 404:
-                print(f"⚠️ Not found: {url}")
-            else:
-                print(f"⚠️ HTTP error {response.status_code}: {response.reason}")
+    def _descargar(solicitud):
+        dia, url, nombre = solicitud
+        if md5s is not None and nombre not in md5s:
+            return dia, None
+        return dia, descargar_y_descomprimir_sp3(url, nombre, carpeta_final, md5=md5s.get(nombre) if md5s else None)
 
-    except Exception as e:
-        print(f"❌ General error: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(solicitudes)))) as pool:
+        rutas = dict(pool.map(_descargar, solicitudes))
+    faltantes = [dia for dia in dias if rutas[dia] is None]
+    if faltantes:
+        return None, faltantes
 
-    return None
+    anio, doy, _ = obtener_anio_doy_semana(fecha_inicio.strftime("%Y-%m-%d"))
+    nombre = f"{centro}0{tipo}{producto}_{anio}{doy:03d}0000_{len(dias):02d}D_{muestreo}_ORB.SP3"
+    destino = Path(carpeta_final) / nombre
+    unir_sp3([rutas[dia] for dia in dias], destino)
+    return destino, []
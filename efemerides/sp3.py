@@ -0,0 +1,299 @@
+"""
+Lectura de órbitas SP3-c/d a arrays densos y su interpolación vectorizada.
+
+Una órbita se guarda como:
+  - epocas:    datetime64[ns] (n_epocas,), tiempo GPS del archivo;
+  - satelites: códigos 'G01', 'E05'... (n_satelites,);
+  - datos:     float64 (n_epocas, n_satelites, 4) con [x, y, z] en km y el reloj
+               en microsegundos, como en el SP3; NaN donde el valor falta o es el
+               centinela de dato malo.
+La primera lectura del texto deja junto al archivo una caché '.npy' que las
+siguientes abren mapeada en memoria, sin volver a parsear.
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+
+PUNTOS_LAGRANGE = 10
+# Bloque de épocas de consulta por iteración: acota la memoria de la interpolación
+BLOQUE_CONSULTA = 2048
+_RELOJ_MALO = 999999.0
+_SUFIJOS_CACHE = (".datos.npy", ".epocas.npy", ".satelites.npy")
+# Sello de la caché: tamaño y MD5 del SP3 del que salieron los '.npy'
+_SUFIJO_SELLO = ".npy.json"
+
+
+class OrbitaSP3:
+    """Órbita precisa en arrays NumPy (época × satélite × [x, y, z, reloj])."""
+
+    def __init__(self, epocas, satelites, datos):
+        self.epocas = np.asarray(epocas, dtype="datetime64[ns]")
+        self.satelites = np.asarray(satelites, dtype="U3")
+        self.datos = datos
+        self._columnas = {sat: i for i, sat in enumerate(self.satelites.tolist())}
+
+    def __len__(self):
+        return len(self.epocas)
+
+    def indices(self, satelites=None) -> np.ndarray:
+        """Columnas de 'satelites' (todas por defecto); KeyError si alguno no está en la órbita."""
+        if satelites is None:
+            return np.arange(len(self.satelites))
+        return np.array([self._columnas[str(sat).upper()] for sat in np.atleast_1d(satelites)], dtype=np.intp)
+
+    def interpolar(self, tiempos, satelites=None, puntos=PUNTOS_LAGRANGE) -> np.ndarray:
+        """
+        Interpolación de Lagrange con 'puntos' épocas alrededor de cada instante.
+        Evalúa todos los tiempos × satélites en una llamada y devuelve
+        float64 (n_tiempos, n_satelites, 4). Fuera del rango de la órbita, o si
+        la ventana incluye un dato faltante, el resultado es NaN.
+        """
+        columnas = self.indices(satelites)
+        consulta = np.atleast_1d(np.asarray(tiempos, dtype="datetime64[ns]"))
+        resultado = np.full((len(consulta), len(columnas), 4), np.nan)
+        n = len(self.epocas)
+        if n == 0 or len(consulta) == 0:
+            return resultado
+        puntos = min(puntos, n)
+
+        # Tiempo en unidades del intervalo de muestreo: pesos bien condicionados
+        escala = np.median(np.diff(self.epocas)).astype("timedelta64[ns]").astype(np.float64) if n > 1 else 1.0
+        nodos = (self.epocas - self.epocas[0]).astype(np.float64) / escala
+        t = (consulta - self.epocas[0]).astype(np.float64) / escala
+        dentro = (t >= nodos[0]) & (t <= nodos[-1])
+
+        # Ventana centrada en cada instante, desplazada hacia dentro en los extremos
+        inicio = np.clip(np.searchsorted(nodos, t) - puntos // 2, 0, n - puntos)
+        ventana = inicio[:, None] + np.arange(puntos)
+        x = nodos[ventana]
+
+        for desde in range(0, len(consulta), BLOQUE_CONSULTA):
+            bloque = slice(desde, desde + BLOQUE_CONSULTA)
+            diferencias = t[bloque, None] - x[bloque]                    # (m, k)
+            denominadores = x[bloque, :, None] - x[bloque, None, :]     # (m, k, k)
+            identidad = np.eye(puntos, dtype=bool)
+            numeradores = np.where(identidad, 1.0, diferencias[:, None, :])
+            denominadores = np.where(identidad, 1.0, denominadores)
+            pesos = np.prod(numeradores / denominadores, axis=2)        # (m, k)
+            valores = self.datos[ventana[bloque]][:, :, columnas, :]    # (m, k, s, 4)
+            resultado[bloque] = np.einsum("mk,mksc->msc", pesos, valores)
+        resultado[~dentro] = np.nan
+        return resultado
+
+    def posiciones(self, tiempos, satelites=None, puntos=PUNTOS_LAGRANGE) -> np.ndarray:
+        """Solo [x, y, z] en km: (n_tiempos, n_satelites, 3)."""
+        return self.interpolar(tiempos, satelites, puntos)[..., :3]
+
+
+def _abrir_texto(ruta: Path):
+    if ruta.suffix.lower() == ".gz":
+        return gzip.open(ruta, "rt", encoding="ascii", errors="replace")
+    return open(ruta, "r", encoding="ascii", errors="replace")
+
+
+def _epoca(linea: str) -> np.datetime64:
+    partes = linea[1:].split()
+    anio, mes, dia, hora, minuto = (int(v) for v in partes[:5])
+    segundos = float(partes[5])
+    base = np.datetime64(f"{anio:04d}-{mes:02d}-{dia:02d}T{hora:02d}:{minuto:02d}", "ns")
+    return base + np.timedelta64(round(segundos * 1e9), "ns")
+
+
+def leer_sp3(ruta) -> OrbitaSP3:
+    """Parsea un SP3-c/d (texto o .gz) a arrays densos; los registros de velocidad se ignoran."""
+    ruta = Path(ruta)
+    with _abrir_texto(ruta) as archivo:
+        lineas = archivo.read().splitlines()
+    if not lineas or not lineas[0].startswith("#") or lineas[0][1:2] not in ("c", "d"):
+        raise ValueError(f"{ruta.name}: no es un SP3-c/d")
+
+    epocas, registros, fila_registro = [], [], []
+    for linea in lineas:
+        marca = linea[:1]
+        if marca == "*":
+            epocas.append(_epoca(linea))
+        elif marca == "P" and epocas:
+            registros.append(linea)
+            fila_registro.append(len(epocas) - 1)
+        elif linea.startswith("EOF"):
+            break
+
+    # Satélites en el orden de aparición; columnas fijas de 14 caracteres para x, y, z y reloj
+    codigos = [linea[1:4].replace(" ", "0") for linea in registros]
+    satelites = list(dict.fromkeys(codigos))
+    columna = {sat: i for i, sat in enumerate(satelites)}
+    campos = np.array([linea[4:60].ljust(56) for linea in registros], dtype="S56").view("S14").reshape(-1, 4)
+    valores = np.char.strip(campos)
+    valores[valores == b""] = b"nan"
+    valores = valores.astype(np.float64)
+
+    datos = np.full((len(epocas), len(satelites), 4), np.nan)
+    datos[np.array(fila_registro, dtype=np.intp), np.array([columna[c] for c in codigos], dtype=np.intp)] = valores
+    # Centinelas de dato malo: posición 0,0,0 y reloj 999999.999999
+    datos[np.all(datos[..., :3] == 0.0, axis=-1), :3] = np.nan
+    reloj = datos[..., 3]
+    reloj[reloj >= _RELOJ_MALO] = np.nan
+    return OrbitaSP3(np.array(epocas, dtype="datetime64[ns]"), satelites, datos)
+
+
+def rutas_cache(ruta) -> tuple[Path, Path, Path]:
+    """Archivos '.npy' (datos, épocas, satélites) que acompañan al SP3."""
+    ruta = Path(ruta)
+    return tuple(ruta.with_name(ruta.name + sufijo) for sufijo in _SUFIJOS_CACHE)
+
+
+def _sello(ruta: Path) -> dict:
+    """
+    Identidad del contenido del SP3. No se usa el mtime: el SP3 de descargas/ es un
+    enlace duro al cuerpo de la caché HTTP, que lo toca en cada acierto.
+    """
+    md5 = hashlib.md5()
+    with open(ruta, "rb") as archivo:
+        while bloque := archivo.read(1024 * 1024):
+            md5.update(bloque)
+    return {"bytes": ruta.stat().st_size, "md5": md5.hexdigest()}
+
+
+def _cache_vigente(ruta: Path) -> bool:
+    sello = ruta.with_name(ruta.name + _SUFIJO_SELLO)
+    if not sello.exists() or not all(a.exists() for a in rutas_cache(ruta)):
+        return False
+    try:
+        guardado = json.loads(sello.read_text())
+    except (OSError, ValueError):
+        return False
+    # El tamaño descarta la mayoría de los cambios sin leer el archivo
+    return guardado.get("bytes") == ruta.stat().st_size and guardado == _sello(ruta)
+
+
+def _guardar_npy(destino: Path, arreglo):
+    temporal = destino.with_name(destino.name + f".{os.getpid()}.tmp")
+    with open(temporal, "wb") as archivo:
+        np.save(archivo, arreglo)
+    os.replace(temporal, destino)
+
+
+def cargar_sp3(ruta, usar_cache=True) -> OrbitaSP3:
+    """
+    Órbita del SP3 en 'ruta'. Con 'usar_cache', la primera vez guarda los arrays
+    como '.npy' junto al archivo y después los abre con mmap (solo lectura), de
+    modo que varias herramientas o procesos comparten las mismas páginas.
+    """
+    ruta = Path(ruta)
+    if usar_cache and _cache_vigente(ruta):
+        datos, epocas, satelites = rutas_cache(ruta)
+        return OrbitaSP3(np.load(epocas), np.load(satelites), np.load(datos, mmap_mode="r"))
+
+    orbita = leer_sp3(ruta)
+    if usar_cache:
+        datos, epocas, satelites = rutas_cache(ruta)
+        sello = ruta.with_name(ruta.name + _SUFIJO_SELLO)
+        try:
+            sello.unlink(missing_ok=True)
+            _guardar_npy(epocas, orbita.epocas)
+            _guardar_npy(satelites, orbita.satelites)
+            _guardar_npy(datos, orbita.datos)
+            # El sello al final: su presencia marca la caché como completa
+            temporal = sello.with_name(sello.name + f".{os.getpid()}.tmp")
+            temporal.write_text(json.dumps(_sello(ruta)))
+            os.replace(temporal, sello)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la caché de {ruta.name}: {e}")
+    return orbita
+
+
+def _clave_epoca(linea: str) -> tuple:
+    """Línea '*' a una tupla comparable (año, mes, día, hora, minuto, segundos)."""
+    partes = linea[1:].split()
+    return tuple(int(v) for v in partes[:5]) + (float(partes[5]),)
+
+
+def _recorrer_epocas(ruta: Path):
+    """Cabecera (líneas hasta la primera época) y claves de época de un SP3, leyendo línea a línea."""
+    cabecera, epocas = [], []
+    with _abrir_texto(ruta) as archivo:
+        for linea in archivo:
+            if linea.startswith("*"):
+                epocas.append(_clave_epoca(linea))
+            elif not epocas:
+                cabecera.append(linea.rstrip("\n"))
+    return cabecera, epocas
+
+
+def _satelites_cabecera(cabecera) -> tuple[list, dict]:
+    """Satélites de las líneas '+' y su exponente de precisión de las líneas '++'."""
+    ids = "".join(l[9:60] for l in cabecera if l.startswith("+ "))
+    precisiones = "".join(l[9:60] for l in cabecera if l.startswith("++"))
+    satelites = [ids[i:i + 3] for i in range(0, len(ids), 3) if ids[i:i + 3].strip("0 ")]
+    exponentes = [precisiones[i:i + 3] for i in range(0, len(precisiones), 3)]
+    return satelites, dict(zip(satelites, exponentes))
+
+
+def _lineas_satelites(satelites, exponentes) -> list:
+    """Líneas '+' y '++' (17 satélites por línea, al menos 5 de cada) para la lista unida."""
+    lineas_mas = max(5, -(-len(satelites) // 17))
+    ids = [s.ljust(3) for s in satelites] + ["  0"] * (lineas_mas * 17 - len(satelites))
+    precisiones = [exponentes.get(s, "  0") for s in satelites] + ["  0"] * (lineas_mas * 17 - len(satelites))
+    mas = [("+  " + f"{len(satelites):3d}" + "   " if i == 0 else "+        ") + "".join(ids[i * 17:(i + 1) * 17])
+           for i in range(lineas_mas)]
+    dobles = ["++       " + "".join(precisiones[i * 17:(i + 1) * 17]) for i in range(lineas_mas)]
+    return mas + dobles
+
+
+def unir_sp3(rutas, destino) -> int:
+    """
+    Une SP3 consecutivos de un mismo centro en un solo producto continuo, en flujo:
+    nunca hay más de una línea de cada archivo en memoria. Las épocas repetidas en
+    la frontera entre días se escriben una vez, tomadas del archivo posterior
+    (el propio día de esa época). Si los archivos traen satélites distintos, la
+    cabecera lista la unión. Devuelve el número de épocas escritas.
+    """
+    rutas = [Path(r) for r in rutas]
+    destino = Path(destino)
+    # Primera pasada: solo cabeceras y líneas '*', para saber qué épocas aporta cada archivo
+    recorridos = [_recorrer_epocas(r) for r in rutas]
+    limites = [epocas[0] if epocas else None for _, epocas in recorridos[1:]] + [None]
+    ultimo, total = None, 0
+    for (_, epocas), limite in zip(recorridos, limites):
+        for epoca in epocas:
+            if (ultimo is None or epoca > ultimo) and (limite is None or epoca < limite):
+                ultimo, total = epoca, total + 1
+
+    cabecera = list(recorridos[0][0])
+    satelites, exponentes = _satelites_cabecera(cabecera)
+    for otra, _ in recorridos[1:]:
+        nuevos, sus_exponentes = _satelites_cabecera(otra)
+        for sat in nuevos:
+            if sat not in exponentes:
+                satelites.append(sat)
+                exponentes[sat] = sus_exponentes.get(sat, "  0")
+    lineas_sat = _lineas_satelites(satelites, exponentes)
+    cabecera[0] = cabecera[0][:32] + f"{total:7d}" + cabecera[0][39:]
+    primera_sat = next(i for i, l in enumerate(cabecera) if l.startswith("+ "))
+    cabecera = [l for l in cabecera if not l.startswith(("+ ", "++"))]
+    cabecera[primera_sat:primera_sat] = lineas_sat
+
+    # Segunda pasada: copiar los bloques de época que sobreviven a la deduplicación
+    temporal = destino.with_name(destino.name + ".tmp")
+    ultimo = None
+    with open(temporal, "w", encoding="ascii", newline="\n") as salida:
+        salida.write("\n".join(cabecera) + "\n")
+        for ruta, limite in zip(rutas, limites):
+            copiar = False
+            with _abrir_texto(ruta) as archivo:
+                for linea in archivo:
+                    if linea.startswith("*"):
+                        epoca = _clave_epoca(linea)
+                        copiar = (ultimo is None or epoca > ultimo) and (limite is None or epoca < limite)
+                        if copiar:
+                            ultimo = epoca
+                    elif linea.startswith("EOF"):
+                        break
+                    if copiar:
+                        salida.write(linea if linea.endswith("\n") else linea + "\n")
+        salida.write("EOF\n")
+    os.replace(temporal, destino)
+    return total
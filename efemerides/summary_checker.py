@@ -1,21 +1,39 @@
 import streamlit as st
+import requests
+from datetime import datetime
 from IGS.authenticator import SessionWithHeaderRedirection
+from common.http_cache import ErrorAutenticacion, cache_http
+from efemerides.generate_files import URL_PRODUCTOS
 
-def obtener_md5sums(semana_gps: int) -> list[str] | None:
-    if "md5sums_cache" not in st.session_state:
-        st.session_state["md5sums_cache"] = {}
-    if semana_gps in st.session_state["md5sums_cache"]:
-        return st.session_state["md5sums_cache"][semana_gps]
-    url = f"https://cddis.nasa.gov/archive/gnss/products/{semana_gps}/MD5SUMS"
+# Semanas GPS con más antigüedad ya tienen todos sus productos finales publicados
+SEMANAS_PARA_CERRAR = 4
+
+def semana_gps_actual() -> int:
+    return (datetime.utcnow() - datetime(1980, 1, 6)).days // 7
+
+def leer_md5sums(semana_gps: int) -> dict[str, str]:
+    """{nombre de archivo: md5} del MD5SUMS de la semana GPS. Propaga los errores HTTP (sin Streamlit)."""
+    url = f"{URL_PRODUCTOS}/{semana_gps}/MD5SUMS"
+    session = SessionWithHeaderRedirection()
+    session.headers.update({"User-Agent": "Mozilla/5.0"})
+    cerrada = semana_gps <= semana_gps_actual() - SEMANAS_PARA_CERRAR
+    ruta = cache_http().obtener(url, session, inmutable=cerrada, timeout=10)
+    hashes = {}
+    for linea in ruta.read_text().strip().splitlines():
+        partes = linea.split()
+        if len(partes) >= 2:
+            hashes[partes[-1].lstrip("*")] = partes[0].lower()
+    return hashes
+
+def obtener_md5sums(semana_gps: int) -> dict[str, str] | None:
+    """{nombre de archivo: md5} publicados en el MD5SUMS de la semana GPS."""
     try:
-        session = SessionWithHeaderRedirection()
-        session.headers.update({"User-Agent": "Mozilla/5.0"})
-        response = session.get(url, timeout=10)
-        if response.status_code == 200:
-            archivos = [line.split()[-1] for line in response.text.strip().splitlines()]
-            st.session_state["md5sums_cache"][semana_gps] = archivos
-            return archivos
-        elif response.status_code == 401:
+        return leer_md5sums(semana_gps)
+    except ErrorAutenticacion:
+        st.warning("⚠️Not Access.")
+    except requests.HTTPError as e:
+        response = e.response
+        if response.status_code == 401:
             st.warning("⚠️Not Access.")
         elif response.status_code == 404:
             st.warning(f"⚠️ Not Found MD5SUMS in the GPS week {semana_gps}")
@@ -24,6 +42,6 @@ def obtener_md5sums(semana_gps: int) -> list[str] | None:
     except Exception as e:
         st.error(f"❌ Error MD5SUMS: {e}")
     return None
-def archivo_esta_disponible(nombre_archivo: str, semana_gps: int) -> bool:
+def md5_publicado(nombre_archivo: str, semana_gps: int) -> str | None:
     archivos = obtener_md5sums(semana_gps)
-    return nombre_archivo in archivos if archivos else False
\ No newline at end of file
+    return archivos.get(nombre_archivo) if archivos else None
\ No newline at end of file
@@ -1,7 +1,4 @@
 import streamlit as st
-import pandas as pd
-from maps import display_map
-from PIL import Image
 
 # Set up page
 st.set_page_config(
@@ -28,6 +25,9 @@ if opcion == "Home":
     path_igs = "data/igs_stations.csv"
     path_noaa = "data/noaa_cors.csv"
 
+    # El mapa (folium, streamlit_folium, scipy) solo se importa si se abre esta vista
+    from maps import display_map
+
     # Llama a la función de visualización completa
     display_map(path_igs, path_noaa)
 
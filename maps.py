@@ -1,82 +1,129 @@
+import math
 import pandas as pd
 import folium
 import streamlit as st
-from folium.plugins import MarkerCluster
-from geopy.distance import geodesic
+from folium.plugins import FastMarkerCluster
+from common.spatial_index import estaciones_cercanas as buscar_cercanas
+from common.stations import registro_igs, registro_noaa, version_archivos
 from streamlit_folium import st_folium
 
-def display_map(path_igs, path_noaa):
-    @st.cache_data
-    def load_data(path_igs, path_noaa):
-        df1 = pd.read_csv(path_igs)
-        df2 = pd.read_csv(path_noaa)
+# Cada estación se dibuja en el navegador a partir de [lat, lon, popup]
+_CALLBACK_MARCADOR = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 5, color: "%(color)s", fill: true, fillColor: "%(color)s", fillOpacity: 0.6});
+    marker.bindPopup(row[2], {maxWidth: 300});
+    return marker;
+}
+"""
+
+LEGEND_HTML = """
+    <div style='position: absolute; top: 10px; right: 10px; width: 180px;
+                background-color: rgba(255, 255, 255, 0.85); 
+                z-index: 1000; 
+                padding: 10px; 
+                border: 1px solid grey; 
+                border-radius: 8px; 
+                font-size: 14px;
+                color: black; 
+                '>
+        <b>🗺️ LEGEND </b><br>
+        <i class="fa fa-circle" style="color:blue"></i> IGS Stations GNSS<br>
+        <i class="fa fa-circle" style="color:green"></i> NOAA Stations GNSS<br>
+        <i class="fa fa-map-marker" style="color:red"></i> Nearest stations<br>
+        <i class="fa fa-star" style="color:purple"></i> Your location
+    </div>
+    """
 
-        df1.columns = df1.columns.str.lower().str.strip()
-        df2.columns = df2.columns.str.lower().str.strip()
+@st.cache_data
+def load_data(path_igs, path_noaa, version=None):
+    # Vista de ambos registros con las columnas del mapa (sin releer los CSV)
+    igs = registro_igs(path_igs).df[["estacion", "latitud", "longitud"]].rename(
+        columns={"estacion": "Station", "latitud": "Latitude", "longitud": "Longitude"})
+    noaa = registro_noaa(path_noaa).df[["Station", "Latitude", "Longitude"]]
+    igs = igs.assign(Station=igs["Station"].astype(str), Source="IGS Stations")
+    noaa = noaa.assign(Station=noaa["Station"].astype(str), Source="NOAA Stations")
+
+    df_all = pd.concat([igs, noaa], ignore_index=True).dropna(subset=['Latitude', 'Longitude'])
+    # Popups construidos por columnas, sin recorrer filas
+    df_all["popup"] = (
+        "<b>Station:</b> " + df_all["Station"] + "<br>"
+        + "<b>Source:</b> " + df_all["Source"] + "<br>"
+        + "<b>Lat:</b> " + df_all["Latitude"].map("{:.4f}".format)
+        + ", <b>Lon:</b> " + df_all["Longitude"].map("{:.4f}".format)
+    )
+    return df_all
+
+@st.cache_resource
+def mapa_base(path_igs, path_noaa, version=None):
+    """
+    Mapa con todas las estaciones, construido y renderizado una vez por versión del catálogo.
+    Cada fuente es una sola capa FastMarkerCluster: los puntos viajan como un array JSON
+    y los marcadores se crean en el navegador.
+    """
+    df_all = load_data(path_igs, path_noaa, version)
+    m = folium.Map(location=[20, 0], zoom_start=2)
+    for fuente, color in (("IGS Stations", "blue"), ("NOAA Stations", "green")):
+        puntos = df_all.loc[df_all["Source"] == fuente, ["Latitude", "Longitude", "popup"]]
+        FastMarkerCluster(
+            puntos.to_numpy().tolist(), callback=_CALLBACK_MARCADOR % {"color": color}, name=fuente
+        ).add_to(m)
 
-        df1 = df1.rename(columns={"site name": "Station", "latitude": "Latitude", "longitude": "Longitude"})
-        df2 = df2.rename(columns={"siteid": "Station", "y": "Latitude", "x": "Longitude"})
-        
-        df1["Source"] = "IGS Stations"
-        df2["Source"] = "NOAA Stations"
-
-        df_all = pd.concat([df1, df2], ignore_index=True).dropna(subset=['Latitude', 'Longitude'])
-        df_all["popup"] = df_all.apply(
-            lambda row: f"<b>Station:</b> {row['Station']}<br>"
-                        f"<b>Source:</b> {row['Source']}<br>"
-                        f"<b>Lat:</b> {row['Latitude']:.4f}, <b>Lon:</b> {row['Longitude']:.4f}",
-            axis=1
-        )
-        return df_all
+    m.get_root().html.add_child(folium.Element(LEGEND_HTML))
+    folium.LayerControl().add_to(m)
+    m.get_root().render()
+    return m
+
+def _encuadre(puntos):
+    """Centro y zoom aproximado que contienen todos los puntos (lat, lon)."""
+    lats = [p[0] for p in puntos]
+    lons = [p[1] for p in puntos]
+    centro = ((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+    extension = max(max(lons) - min(lons), 2 * (max(lats) - min(lats)), 1e-3)
+    zoom = int(max(2, min(12, math.floor(math.log2(360 / extension)) + 1)))
+    return centro, zoom
 
-    df_all = load_data(path_igs, path_noaa)
+def display_map(path_igs, path_noaa):
+    version = version_archivos(path_igs, path_noaa)
+    df_all = load_data(path_igs, path_noaa, version)
 
     # --- Interfaz de usuario ---
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         # Usamos session_state para recordar las coordenadas
         user_lat = st.number_input("Latitude", value=st.session_state.get('user_lat', 4.60971), format="%.6f", key="user_lat")
     with col2:
         user_lon = st.number_input("Longitude", value=st.session_state.get('user_lon', -74.08175), format="%.6f", key="user_lon")
+    with col3:
+        # Radio opcional: 0 mantiene la búsqueda de las 5 más cercanas
+        radio_km = st.number_input("Search radius (km, 0 = 5 nearest)", min_value=0.0, value=0.0, step=50.0)
 
     # Botón para activar la búsqueda y el zoom
     search_button = st.button("Search nearest stations")
 
-    # --- Creación del mapa base ---
-    # Centrado general al inicio
-    m = folium.Map(location=[20, 0], zoom_start=2)
-
-    # ---  Usar MarkerCluster para un rendimiento óptimo ---
-    # Creamos un cluster para cada fuente de datos
-    cluster_igs = MarkerCluster(name="IGS Stations").add_to(m)
-    cluster_noaa = MarkerCluster(name="NOAA Stations").add_to(m)
-
-    # Añadimos los puntos a sus respectivos clusters
-    for _, row in df_all[df_all['Source'] == "IGS Stations"].iterrows():
-        folium.CircleMarker(
-            location=(row["Latitude"], row["Longitude"]), radius=5, color="blue", fill=True, fill_color="blue",
-            fill_opacity=0.6, popup=folium.Popup(row["popup"], max_width=300)
-        ).add_to(cluster_igs)
-
-    for _, row in df_all[df_all['Source'] == "NOAA Stations"].iterrows():
-        folium.CircleMarker(
-            location=(row["Latitude"], row["Longitude"]), radius=5, color="green", fill=True, fill_color="green",
-            fill_opacity=0.6, popup=folium.Popup(row["popup"], max_width=300)
-        ).add_to(cluster_noaa)
+    # --- Mapa base (cacheado por versión del catálogo) ---
+    m = mapa_base(path_igs, path_noaa, version)
+    capa_cercanas = None
+    centro, zoom = None, None
 
     # --- Lógica de búsqueda y zoom (se activa con el botón) ---
     if search_button:
         user_coords = (user_lat, user_lon)
         
-        # Calcular distancias y encontrar las 5 más cercanas
-        df_all["Distance_km"] = df_all.apply(lambda row: geodesic(user_coords, (row["Latitude"], row["Longitude"])).km, axis=1)
-        estaciones_cercanas = df_all.nsmallest(5, "Distance_km")
+        # Consultar el índice espacial: las 5 más cercanas o todas dentro del radio
+        estaciones_cercanas, distancias = buscar_cercanas(
+            df_all, user_lat, user_lon, "Latitude", "Longitude", n=5, radio_km=radio_km or None
+        )
+        estaciones_cercanas["Distance_km"] = distancias
 
-        st.markdown("## 📋 The 5 nearest stations")
+        if radio_km:
+            st.markdown(f"## 📋 {len(estaciones_cercanas)} stations within {radio_km:.0f} km")
+        else:
+            st.markdown("## 📋 The 5 nearest stations")
         st.dataframe(estaciones_cercanas[["Station", "Latitude", "Longitude", "Distance_km", "Source"]])
 
-        # Capa para los marcadores rojos (cercanos)
-        capa_cercanas = folium.FeatureGroup(name="Nearest Stations", show=True).add_to(m)
+        # Capa para los marcadores rojos (cercanos): se añade dinámicamente sobre el mapa base
+        capa_cercanas = folium.FeatureGroup(name="Nearest Stations", show=True)
 
         # Añadir marcador de usuario
         folium.Marker(
@@ -97,31 +144,10 @@ def display_map(path_igs, path_noaa):
         # Creamos una lista de puntos para ajustar el mapa
         puntos_para_zoom = estaciones_cercanas[['Latitude', 'Longitude']].values.tolist()
         puntos_para_zoom.append(user_coords)
-        m.fit_bounds(puntos_para_zoom, padding=(50, 50))
-
-    # --- Leyenda bien posicionada ---
-    legend_html = """
-    <div style='position: absolute; top: 10px; right: 10px; width: 180px;
-                background-color: rgba(255, 255, 255, 0.85); 
-                z-index: 1000; 
-                padding: 10px; 
-                border: 1px solid grey; 
-                border-radius: 8px; 
-                font-size: 14px;
-                color: black; 
-                '>
-        <b>🗺️ LEGEND </b><br>
-        <i class="fa fa-circle" style="color:blue"></i> IGS Stations GNSS<br>
-        <i class="fa fa-circle" style="color:green"></i> NOAA Stations GNSS<br>
-        <i class="fa fa-map-marker" style="color:red"></i> Five nearest stations<br>
-        <i class="fa fa-star" style="color:purple"></i> Your location
-    </div>
-    """
-    m.get_root().html.add_child(folium.Element(legend_html))
-
-    # Añadir control de capas
-    folium.LayerControl().add_to(m)
+        centro, zoom = _encuadre(puntos_para_zoom)
 
     # --- Renderizar el mapa ---
+    # Solo la capa de cercanas y el encuadre cambian entre reruns; el mapa base ya está renderizado
     st.markdown("## 🌐 Interactive Map")
-    st_folium(m, width=900, height=600, returned_objects=[])
\ No newline at end of file
+    st_folium(m, key="mapa_estaciones", width=900, height=600, returned_objects=[],
+              feature_group_to_add=capa_cercanas, center=centro, zoom=zoom, render=False)